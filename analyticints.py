@@ -0,0 +1,243 @@
+"""
+This module computes the one-center exchange integrals K[j, i] = (ji|ji) of an
+element directly from its (q-vSZP) basis set, without ORCA and orca_2json.
+
+All basis functions sit on the same center, so each integral factorizes into
+a radial Slater-Condon integral R^k and an angular factor given by real Gaunt
+coefficients:
+
+    (ij|ij) = sum_k 4 pi / (2k + 1) sum_q <Y_i Y_j Y_kq>^2 R^k(ij, ij)
+
+The radial integrals over Gaussian primitives are evaluated in closed form,
+the Gaunt coefficients by an exact quadrature on the sphere.
+The AOs are ordered as in ORCA (see aoorder.AO_ORDERS), i.e. shell by shell in
+the order of the basis set input and m = 0, +1, -1, +2, -2, ... within a shell.
+"""
+
+import math
+import re
+from functools import cache
+from pathlib import Path
+import numpy as np
+from inthandler import NAO_MAX, ZERO_THRESHOLD, read_exchange_block
+
+# angular momentum of the shell labels in ORCA's NewGTO blocks
+SHELL_LABELS = "SPDFGHI"
+# maximum deviation from the ORCA integrals that is accepted by the check
+ANALYTIC_TOLERANCE = 1e-6
+# a NewGTO block: label line, shells, "end"
+_NEWGTO = re.compile(r"^\s*NewGTO\b(.*?)^\s*end\b", re.IGNORECASE | re.M | re.S)
+
+# basis set shell: angular momentum, exponents, contraction coefficients
+Shell = tuple[int, np.ndarray, np.ndarray]
+
+
+def read_basis(inpfile: Path) -> list[Shell]:
+    """
+    Read the basis set of the element from the NewGTO block of an ORCA input
+    (as written by qvSZP). The contraction coefficients refer to normalized
+    primitives, as in ORCA.
+
+    Args:
+        inpfile (Path): ORCA input file, e.g. hf_q-vSZP.inp.
+
+    Returns:
+        list[Shell]: Shells in the order of the input.
+    """
+    with open(inpfile, encoding="utf8") as f:
+        content = f.read()
+    f.close()
+    block = _NEWGTO.search(content)
+    if block is None:
+        raise ValueError(f"No NewGTO block found in {inpfile}.")
+    # the first line holds the element label
+    lines = [line.split() for line in block.group(1).splitlines()[1:]]
+    lines = [line for line in lines if line and not line[0].startswith("#")]
+    shells: list[Shell] = []
+    pos = 0
+    while pos < len(lines):
+        label, nprim = lines[pos][0].upper(), int(lines[pos][1])
+        if label not in SHELL_LABELS:
+            raise ValueError(f"Unsupported shell type {label} in {inpfile}.")
+        primitives = np.array(
+            [
+                [float(value.replace("D", "E").replace("d", "e")) for value in row[1:3]]
+                for row in lines[pos + 1 : pos + 1 + nprim]
+            ]
+        )
+        if primitives.shape != (nprim, 2):
+            raise ValueError(f"Incomplete {label} shell in {inpfile}.")
+        shells.append((SHELL_LABELS.index(label), primitives[:, 0], primitives[:, 1]))
+        pos += 1 + nprim
+    return shells
+
+
+def radial_coefficients(shell: Shell) -> np.ndarray:
+    """
+    Coefficients d of the normalized radial function
+    R(r) = sum_p d[p] r^l exp(-a[p] r^2) of a contracted shell.
+    """
+    ang, exponents, coefficients = shell
+    # normalization of the primitives
+    coefficients = coefficients * np.sqrt(
+        2.0 * (2.0 * exponents) ** (ang + 1.5) / math.gamma(ang + 1.5)
+    )
+    overlap = math.gamma(ang + 1.5) / (
+        2.0 * np.add.outer(exponents, exponents) ** (ang + 1.5)
+    )
+    return coefficients / np.sqrt(coefficients @ overlap @ coefficients)
+
+
+def radial_primitive_integrals(
+    p: np.ndarray, q: np.ndarray, l1: int, l2: int, k: int
+) -> np.ndarray:
+    """
+    Radial integrals
+    int int r1^(l1+2) exp(-p r1^2) r2^(l2+2) exp(-q r2^2) r<^k / r>^(k+1) dr1 dr2
+    of Gaussian product densities with exponents p and q (broadcast).
+    l1 + k and l2 + k must be even and k <= l1, l2 (Gaunt selection rules).
+    """
+
+    def inner(p: np.ndarray, q: np.ndarray, l1: int, l2: int) -> np.ndarray:
+        # region r2 < r1, integrated in closed form after r2 = t r1
+        # and t = sqrt(p/q) tan(theta)
+        s = (l1 + l2 + 5) / 2
+        b = l2 + 2 + k
+        m = (l1 - k) // 2
+        u2 = q / (p + q)
+        series = sum(
+            math.comb(m, j) * (-1) ** j * u2**j / (b + 2 * j + 1) for j in range(m + 1)
+        )
+        return 0.5 * math.gamma(s) * p**-s * (p / (p + q)) ** ((b + 1) / 2) * series
+
+    return inner(p, q, l1, l2) + inner(q, p, l2, l1)
+
+
+def slater_condon_integral(shell_i: Shell, shell_j: Shell, k: int) -> float:
+    """
+    Radial exchange integral R^k(ij, ij) (G^k, or F^k for i = j) of two
+    contracted shells.
+    """
+    d_i, d_j = radial_coefficients(shell_i), radial_coefficients(shell_j)
+    exponents = np.add.outer(shell_i[1], shell_j[1]).ravel()
+    weights = np.outer(d_i, d_j).ravel()
+    ang = shell_i[0] + shell_j[0]
+    return float(
+        weights
+        @ radial_primitive_integrals(
+            exponents[:, None], exponents[None, :], ang, ang, k
+        )
+        @ weights
+    )
+
+
+def orca_m_order(ang: int) -> list[int]:
+    """
+    Magnetic quantum numbers of the real AOs of a shell in ORCA's order.
+    """
+    return [0] + [sign * m for m in range(1, ang + 1) for sign in (1, -1)]
+
+
+def real_spherical_harmonics(
+    lmax: int, cos_theta: np.ndarray, phi: np.ndarray
+) -> dict[tuple[int, int], np.ndarray]:
+    """
+    Orthonormal real spherical harmonics Y_lm (m > 0: cos(m phi), m < 0:
+    sin(|m| phi)) for all l <= lmax at the given points. The phases are
+    irrelevant here, since only squared Gaunt coefficients are used.
+    """
+    cos_theta, phi = np.broadcast_arrays(cos_theta, phi)
+    sin_theta = np.sqrt(1.0 - cos_theta**2)
+    harmonics: dict[tuple[int, int], np.ndarray] = {}
+    for m in range(lmax + 1):
+        # associated Legendre functions P_l^m by upward recursion in l
+        legendre = {m: math.prod(range(2 * m - 1, 0, -2)) * sin_theta**m}
+        if m < lmax:
+            legendre[m + 1] = (2 * m + 1) * cos_theta * legendre[m]
+        for ang in range(m + 2, lmax + 1):
+            legendre[ang] = (
+                (2 * ang - 1) * cos_theta * legendre[ang - 1]
+                - (ang + m - 1) * legendre[ang - 2]
+            ) / (ang - m)
+        for ang in range(m, lmax + 1):
+            norm = math.sqrt(
+                (2 * ang + 1)
+                / (4.0 * math.pi)
+                * math.factorial(ang - m)
+                / math.factorial(ang + m)
+            )
+            if m == 0:
+                harmonics[(ang, 0)] = norm * legendre[ang]
+            else:
+                norm *= math.sqrt(2.0)
+                harmonics[(ang, m)] = norm * legendre[ang] * np.cos(m * phi)
+                harmonics[(ang, -m)] = norm * legendre[ang] * np.sin(m * phi)
+    return harmonics
+
+
+@cache
+def angular_factors(l_i: int, l_j: int) -> dict[int, np.ndarray]:
+    """
+    Angular factors 4 pi / (2k + 1) sum_q <Y_i Y_j Y_kq>^2 of the exchange
+    integrals between the AOs of two shells (in ORCA's order) for each k.
+    """
+    lmax = 2 * max(l_i, l_j)
+    # Gauss-Legendre in cos(theta) and trapezoid in phi are exact for the
+    # products of three harmonics of degree <= 2 * lmax
+    cos_theta, weights_theta = np.polynomial.legendre.leggauss(lmax + 1)
+    nphi = 2 * lmax + 1
+    phi = 2.0 * math.pi * np.arange(nphi) / nphi
+    harmonics = real_spherical_harmonics(lmax, cos_theta[:, None], phi[None, :])
+    weights = np.outer(weights_theta, np.full(nphi, 2.0 * math.pi / nphi))
+    y_i = np.array([harmonics[(l_i, m)] for m in orca_m_order(l_i)])
+    y_j = np.array([harmonics[(l_j, m)] for m in orca_m_order(l_j)])
+    factors: dict[int, np.ndarray] = {}
+    for k in range(abs(l_i - l_j), l_i + l_j + 1, 2):
+        y_k = np.array([harmonics[(k, m)] for m in range(-k, k + 1)])
+        gaunt = np.einsum("iab,jab,qab,ab->ijq", y_i, y_j, y_k, weights)
+        factors[k] = 4.0 * math.pi / (2 * k + 1) * (gaunt**2).sum(axis=2)
+    return factors
+
+
+def analytic_exchange_block(shells: list[Shell], nao: int = NAO_MAX) -> np.ndarray:
+    """
+    Exchange integrals K[j, i] = (ji|ji) of all AOs of a one-center basis set.
+
+    Args:
+        shells (list[Shell]): Basis set (see read_basis).
+        nao (int): Dimension of the returned matrix (see read_exchange_block).
+
+    Returns:
+        np.ndarray: Exchange matrix with shape (nao, nao) in ORCA's AO order.
+    """
+    offsets = np.cumsum([0] + [2 * shell[0] + 1 for shell in shells])
+    if offsets[-1] > nao:
+        raise ValueError(f"The basis set has {offsets[-1]} > {nao} AOs.")
+    kmat = np.zeros((nao, nao))
+    for ishell, shell_i in enumerate(shells):
+        for jshell, shell_j in enumerate(shells[: ishell + 1]):
+            block = np.zeros((2 * shell_i[0] + 1, 2 * shell_j[0] + 1))
+            for k, factor in angular_factors(shell_i[0], shell_j[0]).items():
+                block += factor * slater_condon_integral(shell_i, shell_j, k)
+            rows = slice(offsets[ishell], offsets[ishell + 1])
+            cols = slice(offsets[jshell], offsets[jshell + 1])
+            kmat[rows, cols] = block
+            kmat[cols, rows] = block.T
+    return kmat
+
+
+def compare_with_json(element_path: Path) -> tuple[float, float]:
+    """
+    Compare the analytic exchange integrals of a calculated element (basis set
+    from hf_q-vSZP.inp) with the ones computed by ORCA (hf_q-vSZP.json).
+
+    Returns:
+        tuple[float, float]: Maximum absolute and relative deviation
+                             (relative for integrals above ZERO_THRESHOLD).
+    """
+    analytic = analytic_exchange_block(read_basis(element_path / "hf_q-vSZP.inp"))
+    reference = read_exchange_block(element_path / "hf_q-vSZP.json")
+    deviation = np.abs(analytic - reference)
+    nonzero = np.abs(reference) > ZERO_THRESHOLD
+    relative = deviation[nonzero] / np.abs(reference[nonzero])
+    return float(deviation.max()), float(relative.max(initial=0.0))
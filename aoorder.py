@@ -0,0 +1,96 @@
+"""
+This module contains the orderings of the spherical AOs used by the different
+programs and routines to map AO indices, integral tensors and exchange matrices
+from one ordering to another.
+
+New orderings are added as an entry in AO_ORDERS.
+"""
+
+import numpy as np
+
+# AO labels of a shell set (s, p, d, f) in the order used by the program
+AO_ORDERS: dict[str, tuple[str, ...]] = {
+    "orca": (
+        "s",
+        "pz",
+        "px",
+        "py",
+        "dz2",
+        "dxz",
+        "dyz",
+        "dx2-y2",
+        "dxy",
+        "fz3",
+        "fxz2",
+        "fyz2",
+        "fz(x2-y2)",
+        "fxyz",
+        "fx(x2-3y2)",
+        "fy(3x2-y2)",
+    ),
+    "gp3": (
+        "s",
+        "px",
+        "py",
+        "pz",
+        "dx2-y2",
+        "dz2",
+        "dxy",
+        "dxz",
+        "dyz",
+    ),
+}
+
+
+def ao_permutation(source: str, target: str, nao: int) -> np.ndarray:
+    """
+    Lookup table that maps AO indices in the `source` ordering
+    to AO indices in the `target` ordering: new_index = lut[old_index].
+    AOs that are not declared in both orderings keep their index.
+
+    Args:
+        source (str): Name of the source ordering in AO_ORDERS.
+        target (str): Name of the target ordering in AO_ORDERS.
+        nao (int): Number of AOs.
+
+    Returns:
+        np.ndarray: Permutation of range(nao).
+    """
+    source_labels = AO_ORDERS[source]
+    target_labels = AO_ORDERS[target]
+    lut = np.arange(nao)
+    for index, label in enumerate(source_labels[:nao]):
+        if label in target_labels:
+            lut[index] = target_labels.index(label)
+    if not np.array_equal(np.sort(lut), np.arange(nao)):
+        raise ValueError(
+            f"AO orderings {source} and {target} do not define a permutation "
+            + f"of {nao} AOs."
+        )
+    return lut
+
+
+def permute_indices(indices: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """
+    Map an array of AO indices (e.g. the p, q, r, s columns of the
+    2-el integral rows) with a single lookup-table gather.
+    """
+    return lut[np.asarray(indices, dtype=np.intp)]
+
+
+def permute_tensor(ints: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """
+    Reorder a four-index integral array:
+    new[lut[p], lut[q], lut[r], lut[s]] = old[p, q, r, s].
+    """
+    inv = np.argsort(lut)
+    return ints[np.ix_(inv, inv, inv, inv)]
+
+
+def permute_matrix(kmat: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """
+    Reorder an AO x AO matrix (e.g. the exchange matrix):
+    new[lut[i], lut[j]] = old[i, j].
+    """
+    inv = np.argsort(lut)
+    return kmat[np.ix_(inv, inv)]
@@ -0,0 +1,223 @@
+"""
+This module contains the backends for running the elements as independent jobs
+of a job array, e.g. on a batch system such as SLURM.
+
+Each array task runs main.py for a group of elements (shard) without assembling
+the results (--shard). A final merge job (main.py --merge) collects the
+per-element results and writes onecxcints.npy and the Fortran files.
+
+All backends implement submit(tasks, merge) -> str. The LocalArrayBackend runs
+the tasks on the local machine in the same way as the SLURM job array, so that
+the sharded workflow can be tested without a cluster.
+"""
+
+import os
+import shlex
+import subprocess as sp
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# name of the job array and of the generated scripts
+JOB_NAME = "onecxcints"
+BATCH_BACKENDS = ("slurm", "local")
+# options of main.py that control the submission and are not passed to the tasks
+# (with the number of values they take)
+BATCH_OPTIONS: dict[str, int] = {
+    "--batch": 1,
+    "--shards": 1,
+    "--submit": 0,
+    "--sbatch": 1,
+    "--elements": 1,
+    "-se": 1,
+    "--specific_element": 1,
+}
+
+
+def shard_elements(elements: list[int], nshards: int) -> list[list[int]]:
+    """
+    Distribute the elements round-robin over `nshards` groups, so that the
+    expensive Ln's/Ac's are spread over the shards.
+    """
+    nshards = max(1, min(nshards, len(elements)))
+    return [elements[ishard::nshards] for ishard in range(nshards)]
+
+
+def strip_options(argv: list[str], options: dict[str, int]) -> list[str]:
+    """
+    Remove the given options (and their values) from a command line.
+    """
+    stripped: list[str] = []
+    skip = 0
+    for arg in argv:
+        if skip:
+            skip -= 1
+            continue
+        name = arg.split("=", 1)[0]
+        if name in options:
+            skip = options[name] if "=" not in arg else 0
+            continue
+        stripped.append(arg)
+    return stripped
+
+
+class SlurmArrayBackend:
+    """
+    Writes a SLURM job array script with one array task per command and
+    a merge script. If `submit` is True, both are submitted with sbatch,
+    the merge job depending on the completion of the whole array.
+
+    Args:
+        workdir (Path): Working directory of the jobs.
+        ntasks (int): Number of tasks (MPI ranks) per array task.
+        options (list[str]): Additional #SBATCH options, e.g. "--time=02:00:00".
+        submit (bool): Submit the scripts with sbatch.
+    """
+
+    def __init__(
+        self,
+        workdir: Path,
+        ntasks: int = 1,
+        options: list[str] | None = None,
+        submit: bool = False,
+    ) -> None:
+        self.workdir = workdir
+        self.ntasks = ntasks
+        self.options = options or []
+        self.submit_jobs = submit
+
+    def header(self, name: str, output: str, ntasks: int) -> list[str]:
+        """
+        Shebang and #SBATCH lines of a script.
+        """
+        lines = [
+            "#!/bin/bash",
+            f"#SBATCH --job-name={name}",
+            f"#SBATCH --ntasks={ntasks}",
+            "#SBATCH --cpus-per-task=1",
+            f"#SBATCH --output={output}",
+        ]
+        lines += [f"#SBATCH {option}" for option in self.options]
+        return lines
+
+    def array_script(self, tasks: list[list[str]]) -> str:
+        """
+        Job array script that runs tasks[$SLURM_ARRAY_TASK_ID].
+        """
+        lines = self.header(JOB_NAME, f"{JOB_NAME}_%A_%a.out", self.ntasks)
+        lines.insert(2, f"#SBATCH --array=0-{len(tasks) - 1}")
+        lines += [
+            f"cd {shlex.quote(str(self.workdir))}",
+            "case $SLURM_ARRAY_TASK_ID in",
+        ]
+        lines += [
+            f"  {itask}) exec {shlex.join(task)} ;;" for itask, task in enumerate(tasks)
+        ]
+        lines += ["esac", ""]
+        return "\n".join(lines)
+
+    def merge_script(self, merge: list[str]) -> str:
+        """
+        Script of the merge job (serial).
+        """
+        lines = self.header(JOB_NAME + "_merge", f"{JOB_NAME}_merge_%j.out", 1)
+        lines += [f"cd {shlex.quote(str(self.workdir))}", shlex.join(merge), ""]
+        return "\n".join(lines)
+
+    def submit(self, tasks: list[list[str]], merge: list[str]) -> str:
+        """
+        Write (and submit) the array and merge scripts.
+
+        Returns:
+            str: The job id of the array or, if not submitted, the array script.
+        """
+        scripts = {
+            self.workdir / f"{JOB_NAME}_array.sh": self.array_script(tasks),
+            self.workdir / f"{JOB_NAME}_merge.sh": self.merge_script(merge),
+        }
+        for script, content in scripts.items():
+            with open(script, "w", encoding="utf8") as f:
+                f.write(content)
+            f.close()
+            script.chmod(0o755)
+            print(f"Written {script}")
+        array_script, merge_script = scripts
+        if not self.submit_jobs:
+            print(f"Submit with: sbatch {array_script.name}")
+            print(f"Afterwards, merge with: sbatch {merge_script.name}")
+            return str(array_script)
+        job_id = sp.run(
+            ["sbatch", "--parsable", str(array_script)],
+            cwd=self.workdir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        merge_id = sp.run(
+            [
+                "sbatch",
+                "--parsable",
+                f"--dependency=afterany:{job_id}",
+                str(merge_script),
+            ],
+            cwd=self.workdir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        print(f"Submitted job array {job_id} and merge job {merge_id}.")
+        return job_id
+
+
+class LocalArrayBackend:
+    """
+    Stand-in for a batch system: runs the array tasks as local processes
+    (at most `max_parallel` at once) with the SLURM array environment variables
+    and the output files of SLURM, then runs the merge command once all tasks
+    have finished (as the "afterany" dependency does).
+
+    Args:
+        workdir (Path): Working directory of the tasks.
+        max_parallel (int): Number of tasks run concurrently.
+    """
+
+    def __init__(self, workdir: Path, max_parallel: int = 1) -> None:
+        self.workdir = workdir
+        self.max_parallel = max_parallel
+        self.returncodes: list[int] = []
+        self.merge_returncode: int | None = None
+
+    def run_task(self, itask: int, task: list[str]) -> int:
+        """
+        Run a single array task and return its exit code.
+        """
+        env = {
+            **os.environ,
+            "SLURM_ARRAY_JOB_ID": "local",
+            "SLURM_ARRAY_TASK_ID": str(itask),
+        }
+        with open(
+            self.workdir / f"{JOB_NAME}_local_{itask}.out", "w", encoding="utf8"
+        ) as f:
+            process = sp.run(
+                task, cwd=self.workdir, env=env, stdout=f, stderr=sp.STDOUT, check=False
+            )
+        f.close()
+        print(f"Array task {itask} finished with exit code {process.returncode}.")
+        return process.returncode
+
+    def submit(self, tasks: list[list[str]], merge: list[str]) -> str:
+        """
+        Run all array tasks and the merge command.
+
+        Returns:
+            str: The job id "local".
+        """
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            self.returncodes = list(
+                executor.map(self.run_task, range(len(tasks)), tasks)
+            )
+        nfailed = sum(1 for returncode in self.returncodes if returncode != 0)
+        if nfailed:
+            print(f"{nfailed} of {len(tasks)} array task(s) failed.")
+        self.merge_returncode = sp.run(merge, cwd=self.workdir, check=False).returncode
+        return "local"
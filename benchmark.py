@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the Python-side processing of the 2-el integrals.
+
+The benchmarks work without ORCA output: synthetic hf_q-vSZP.json files with
+the AO_PQRS layout written by orca_2json are generated for the different AO
+layouts of q-vSZP. The results are printed and written as JSON
+(benchmark_results.json) so that regressions can be tracked over time.
+
+Usage:
+    python benchmark.py [--output benchmark_results.json] [--repeat 5]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess as sp
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+import numpy as np
+from inthandler import (
+    NAO_MAX,
+    ZERO_THRESHOLD,
+    average_shell_exchange_integrals,
+    average_shell_exchange_integrals_batched,
+    exchange_block,
+    jsonhandler_no_resorting,
+    jsonhandler_resorting_legacy,
+    scatter_integrals,
+    sidecar_paths,
+)
+from fortranarray import write_fortran_array, write_fortran_binary, write_fortran_data
+from instrument import max_rss
+
+# cold-start target for read-only and Fortran-export-only invocations of main.py
+STARTUP_TARGET = 0.5
+# number of AOs of the AO layouts of q-vSZP
+# (H/He, general case, Fr/Ra-like without f, Ln's/Ac's)
+LAYOUT_NAOS: tuple[int, ...] = (4, 9, 16, 29)
+# default output file of the benchmark results
+RESULTS_FILE = "benchmark_results.json"
+
+Record = dict[str, Any]
+
+
+def synthetic_rows(nao: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generate symmetry-unique 2-el integral rows (p >= q, r >= s, pq >= rs)
+    for `nao` AOs with random values.
+    """
+    rng = np.random.default_rng(seed)
+    p, q = np.tril_indices(nao)
+    pair_p, pair_q = np.tril_indices(p.shape[0])
+    indices = np.column_stack((p[pair_p], q[pair_p], p[pair_q], q[pair_q]))
+    values = rng.exponential(0.1, (indices.shape[0],))
+    return indices.astype(np.int32), values
+
+
+def write_synthetic_json(jsonfile: Path, nao: int, seed: int = 0) -> int:
+    """
+    Write a synthetic hf_q-vSZP.json file for `nao` AOs in the layout of
+    orca_2json (one [p, q, r, s, value] row per line in
+    Molecule -> 2elIntegrals -> AO_PQRS[0]).
+    As in the ORCA output, integrals below ZERO_THRESHOLD are not written.
+
+    Returns:
+        int: Number of integral rows in the file.
+    """
+    indices, values = synthetic_rows(nao, seed)
+    # screen a fraction of the integrals as ORCA does for (near-)zero integrals
+    values[np.random.default_rng(seed + 1).random(values.shape[0]) < 0.2] = 0.0
+    keep = values > ZERO_THRESHOLD
+    indices, values = indices[keep], values[keep]
+    rows = ",\n".join(
+        f"          [{p}, {q}, {r}, {s}, {v:.16e}]"
+        for (p, q, r, s), v in zip(indices.tolist(), values.tolist())
+    )
+    with open(jsonfile, "w", encoding="utf8") as f:
+        f.write(
+            '{\n  "Molecule": {\n    "Atoms": [],\n    "2elIntegrals": {\n'
+            + '      "AO_PQRS": [\n        [\n'
+            + rows
+            + "\n        ]\n      ]\n    }\n  }\n}\n"
+        )
+    f.close()
+    return int(values.shape[0])
+
+
+def measure(
+    func: Callable[[], Any],
+    repeat: int,
+    setup: Callable[[], Any] | None = None,
+) -> tuple[float, int]:
+    """
+    Best wall time of `repeat` calls of `func` and the peak memory
+    allocated during one (separate) traced call.
+    `setup` is called before each call and is not timed.
+    Output of `func` is suppressed.
+
+    Returns:
+        tuple[float, int]: Wall time in s, peak memory in bytes.
+    """
+    setup = setup or (lambda: None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = []
+        for _ in range(repeat):
+            setup()
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        setup()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+
+def print_record(record: Record) -> None:
+    """
+    Print a benchmark result in a single line.
+    """
+    throughput = (
+        f"{record['rows_per_s']:12.3e} rows/s"
+        if "rows_per_s" in record
+        else f"{record['elements_per_s']:12.1f} el./s"
+    )
+    print(
+        f"{record['benchmark']:<40} {record.get('nao', ''):>4} "
+        + f"{record['seconds'] * 1e3:10.2f} ms {throughput} "
+        + f"{record['peak_memory_bytes'] / 2**20:9.2f} MiB"
+    )
+
+
+def bench_handlers(
+    naos: tuple[int, ...] = LAYOUT_NAOS, repeat: int = 5
+) -> list[Record]:
+    """
+    Time jsonhandler_no_resorting and jsonhandler_resorting_legacy on synthetic
+    JSON files. The handlers are timed reading the JSON file ("cold", binary
+    sidecars removed before each call) and reading the sidecars ("warm").
+    The legacy handler is only timed for layouts with at most 9 AOs.
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for nao in naos:
+            jsonfile = Path(workdir) / f"{nao}" / "hf_q-vSZP.json"
+            jsonfile.parent.mkdir()
+            nrows = write_synthetic_json(jsonfile, nao)
+
+            def remove_sidecars(jsonfile: Path = jsonfile) -> None:
+                for sidecar in sidecar_paths(jsonfile):
+                    sidecar.unlink(missing_ok=True)
+
+            handlers = {"jsonhandler_no_resorting": jsonhandler_no_resorting}
+            if nao <= 9:
+                handlers["jsonhandler_resorting_legacy"] = jsonhandler_resorting_legacy
+            for name, handler in handlers.items():
+                for mode, setup in (("cold", remove_sidecars), ("warm", None)):
+                    seconds, peak = measure(
+                        partial(handler, jsonfile, "X", False, dump_format="none"),
+                        repeat,
+                        setup,
+                    )
+                    records.append(
+                        {
+                            "benchmark": f"{name} ({mode})",
+                            "nao": nao,
+                            "rows": nrows,
+                            "seconds": seconds,
+                            "rows_per_s": nrows / seconds,
+                            "peak_memory_bytes": peak,
+                        }
+                    )
+    return records
+
+
+def bench_averaging(repeat: int = 5) -> list[Record]:
+    """
+    Time the shell-pair averaging of all 103 elements, element by element
+    (average_shell_exchange_integrals) and batched over the stored exchange
+    matrices (average_shell_exchange_integrals_batched).
+    """
+    indices, values = synthetic_rows(NAO_MAX)
+    ints = scatter_integrals(indices, values, NAO_MAX)
+    elements = range(1, 104)
+    kblocks = np.zeros((104, NAO_MAX, NAO_MAX))
+    kblocks[1:] = exchange_block(ints)
+
+    records = []
+    for name, func in (
+        (
+            "average_shell_exchange_integrals",
+            lambda: [
+                average_shell_exchange_integrals(ints, i, False) for i in elements
+            ],
+        ),
+        (
+            "average_shell_exchange_integrals_batched",
+            lambda: average_shell_exchange_integrals_batched(kblocks),
+        ),
+    ):
+        seconds, peak = measure(func, repeat)
+        records.append(
+            {
+                "benchmark": name,
+                "nao": NAO_MAX,
+                "elements": len(elements),
+                "seconds": seconds,
+                "elements_per_s": len(elements) / seconds,
+                "peak_memory_bytes": peak,
+            }
+        )
+    return records
+
+
+def bench_fortran(repeat: int = 5) -> list[Record]:
+    """
+    Time the Fortran writers for a (9, 104) onecxcints array.
+    The output file is removed before each call so that it is always written.
+    """
+    onecxcints = np.random.default_rng(0).random((9, 104))
+    nelem = onecxcints.shape[1] - 1
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, writer, outfile in (
+            ("write_fortran_array", write_fortran_array, "onecxcints_array.f90"),
+            ("write_fortran_data", write_fortran_data, "onecxcints_data.f90"),
+            ("write_fortran_binary", write_fortran_binary, "onecxcints.bin"),
+        ):
+            outpath = Path(workdir) / outfile
+            seconds, peak = measure(
+                partial(writer, onecxcints, str(outpath)),
+                repeat,
+                partial(outpath.unlink, missing_ok=True),
+            )
+            records.append(
+                {
+                    "benchmark": name,
+                    "elements": nelem,
+                    "seconds": seconds,
+                    "elements_per_s": nelem / seconds,
+                    "peak_memory_bytes": peak,
+                }
+            )
+    return records
+
+
+def bench_plot(repeat: int = 1) -> list[Record]:
+    """
+    Time the headless rendering of the onecxcints plot.
+    Skipped if the plotting libraries are not installed.
+    """
+    try:
+        from plot import plot_onexc_ints  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        print(f"Skipping the plot benchmark: {err}")
+        return []
+    onecxcints = np.random.default_rng(0).random((9, 104))
+    nelem = onecxcints.shape[1]
+    with tempfile.TemporaryDirectory() as workdir:
+        seconds, peak = measure(
+            lambda: plot_onexc_ints(
+                onecxcints, headless=True, outfile=str(Path(workdir) / "plot.png")
+            ),
+            repeat,
+        )
+    return [
+        {
+            "benchmark": "plot_onexc_ints (headless)",
+            "elements": nelem,
+            "seconds": seconds,
+            "elements_per_s": nelem / seconds,
+            "peak_memory_bytes": peak,
+        }
+    ]
+
+
+def scatter_integrals_loop(integrals_array: np.ndarray, nao: int) -> np.ndarray:
+    """
+    Reference implementation: row-wise scatter as done before the vectorization.
+    """
+    twoelints = np.zeros((nao, nao, nao, nao))
+    for row in integrals_array:
+        twoelints[int(row[0]), int(row[1]), int(row[2]), int(row[3])] = row[4]
+    return twoelints
+
+
+def bench_scatter(naos: tuple[int, ...] = (9, 16, 29), repeat: int = 5) -> list[Record]:
+    """
+    Compare the row-wise loop with the vectorized scatter of the 2-el integrals.
+    """
+    print(
+        f"{'nAO':>4} {'rows':>8} {'loop / ms':>10} {'vector / ms':>12} {'speedup':>8}"
+    )
+    records = []
+    for nao in naos:
+        indices, values = synthetic_rows(nao)
+        integrals_array = np.column_stack((indices, values))
+        assert np.array_equal(
+            scatter_integrals_loop(integrals_array, nao),
+            scatter_integrals(indices, values, nao),
+        )
+        t_loop = min(
+            timeit.repeat(
+                lambda: scatter_integrals_loop(integrals_array, nao),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        t_vec = min(
+            timeit.repeat(
+                lambda: scatter_integrals(indices, values, nao),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(
+            f"{nao:4d} {values.shape[0]:8d} {t_loop * 1e3:10.2f} "
+            + f"{t_vec * 1e3:12.2f} {t_loop / t_vec:8.1f}"
+        )
+        records.append(
+            {
+                "benchmark": "scatter_integrals",
+                "nao": nao,
+                "rows": int(values.shape[0]),
+                "seconds": t_vec,
+                "rows_per_s": values.shape[0] / t_vec,
+                "loop_seconds": t_loop,
+            }
+        )
+    return records
+
+
+def bench_startup(repeat: int = 5) -> list[Record]:
+    """
+    Wall time of `main.py --read-only --no-plot` (Fortran export of an existing
+    onecxcints.npy) compared to STARTUP_TARGET.
+    """
+    main_py = Path(__file__).resolve().parent / "main.py"
+    with tempfile.TemporaryDirectory() as workdir:
+        np.save(Path(workdir) / "onecxcints.npy", np.zeros((9, 104)))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            sp.run(
+                [sys.executable, str(main_py), "--read-only", "--no-plot"],
+                cwd=workdir,
+                capture_output=True,
+                check=True,
+            )
+            timings.append(time.perf_counter() - start)
+    status = "OK" if min(timings) <= STARTUP_TARGET else "SLOW"
+    print(
+        f"cold start (read-only, Fortran export): {min(timings) * 1e3:.0f} ms "
+        + f"(target: {STARTUP_TARGET * 1e3:.0f} ms) {status}"
+    )
+    return [
+        {
+            "benchmark": "startup (read-only, Fortran export)",
+            "seconds": min(timings),
+            "target_seconds": STARTUP_TARGET,
+        }
+    ]
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Run all benchmarks and write the results to a JSON file.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=RESULTS_FILE,
+        help=f"JSON file for the results (default: {RESULTS_FILE}).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of timed calls per benchmark (the best is reported).",
+    )
+    parser.add_argument(
+        "--no-plot",
+        action="store_true",
+        default=False,
+        help="Skip the plot benchmark.",
+    )
+    args = parser.parse_args(argv)
+
+    records = bench_scatter(repeat=args.repeat)
+    records += bench_startup(repeat=args.repeat)
+    print(
+        f"{'benchmark':<40} {'nAO':>4} {'time':>13} {'throughput':>19} "
+        + f"{'peak memory':>13}"
+    )
+    staged = bench_handlers(repeat=args.repeat)
+    staged += bench_averaging(repeat=args.repeat)
+    staged += bench_fortran(repeat=args.repeat)
+    if not args.no_plot:
+        staged += bench_plot()
+    for record in staged:
+        print_record(record)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "max_rss_bytes": max_rss(),
+        "results": records + staged,
+    }
+    with open(args.output, "w", encoding="utf8") as f:
+        json.dump(results, f, indent=2)
+    f.close()
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+This module contains the routines for running the
+qvSZP -> ORCA -> orca_2json chain for a single element.
+"""
+
+import os
+import re
+import shutil
+import subprocess as sp
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+import numpy as np
+
+from strucio import xyzwriter
+from instrument import Timings
+
+BASIS_FILE = "/Users/marcelmueller/source/qvSZP/q-vSZP_basis/basisq-3.0.0"
+ECP_FILE = "/Users/marcelmueller/source/qvSZP/q-vSZP_basis/ecpq"
+CONF_FILE = "hf_q-vSZP.json.conf"
+QVSZP_PATH = "qvSZP"
+ORCA_PATH = "orca"
+# per-element result (shell averages and exchange integrals) used for resuming
+RESULT_FILE = "result.npz"
+# input files written by prepare_element ("{symbol}" is the element symbol)
+INPUT_FILES: tuple[str, ...] = (CONF_FILE, "{symbol}.xyz", ".UHF", "ext.charges")
+# files that are copied back from a scratch directory, everything else is pruned
+SCRATCH_ARTIFACTS: tuple[str, ...] = (
+    "hf_q-vSZP.inp",
+    "hf_q-vSZP.json",
+    "orca.out",
+    "orca_2json.out",
+)
+GBW_FILE = "hf_q-vSZP.gbw"
+# converged orbitals of a previous calculation used as initial guess (warm start)
+GUESS_FILE = "guess.gbw"
+# number of SCF cycles in the ORCA output
+SCF_CONVERGED = re.compile(r"SCF CONVERGED AFTER\s+(\d+)\s+CYCLES")
+# distance of a guess with a different charge model (external charges or CEH)
+OTHER_CHARGE_MODEL_DISTANCE = 1.0e3
+
+
+class CalculationError(RuntimeError):
+    """
+    Raised if one of the external programs fails for an element.
+    """
+
+
+@cache
+def find_binaries() -> dict[str, str]:
+    """
+    Resolve the qvSZP and ORCA binaries in $PATH.
+    Only called if calculations are actually performed.
+    """
+    binaries: dict[str, str] = {}
+    for name in (QVSZP_PATH, ORCA_PATH):
+        binary = shutil.which(name)
+        if binary is None:
+            raise FileNotFoundError(f"Could not find {name} in $PATH.")
+        print("Binary used:")
+        print(binary)
+        binaries[name] = binary
+    return binaries
+
+
+def charge_model(q_cn: dict[str, float] | None) -> str:
+    """
+    Charge model passed to qvSZP: external charges if given, otherwise CEH.
+    """
+    return "ext" if q_cn is not None else "ceh_external"
+
+
+def prepare_element(
+    ati: int,
+    symbol: str,
+    element_path: Path,
+    q_cn: dict[str, float] | None,
+) -> str:
+    """
+    Create the element directory and write all input files for qvSZP.
+
+    Args:
+        ati (int): Atomic number of the element.
+        symbol (str): Lower case element symbol.
+        element_path (Path): Directory in which the calculation is run.
+        q_cn (dict | None): External charge and CN ({"q": ..., "CN": ...})
+                            or None if the CEH charges should be used.
+
+    Returns:
+        str: The charge model to be passed to qvSZP.
+    """
+    element_path.mkdir(exist_ok=True)
+    print(f"Successfully created the directory {element_path}")
+
+    # Copy "hf_q-vSZP.json.conf" to the element directory
+    shutil.copy(CONF_FILE, element_path)
+
+    # Write the xyz file with the uppercase element symbols and the lower case file name
+    strucfile = element_path / (symbol + ".xyz")
+    if ati % 2:
+        with open(element_path / ".UHF", "w", encoding="utf8") as f:
+            f.write("1")
+        f.close()
+    xyzwriter(symbol.upper(), strucfile)
+
+    # if external charges are used, write the charges to the file "ext.charges"
+    if q_cn is not None:
+        with open(element_path / "ext.charges", "w", encoding="utf8") as f:
+            f.write(str(q_cn["q"]) + " " + str(q_cn["CN"]))
+        f.close()
+    return charge_model(q_cn)
+
+
+def qvszp_command(
+    qvszp_binary: str, strucfile: str, chargemodel: str, mpi: int
+) -> list[str]:
+    """
+    Assemble the qvSZP command line for a single element.
+    """
+    return [
+        qvszp_binary,
+        "--struc",
+        strucfile,
+        "--bfile",
+        BASIS_FILE,
+        "--efile",
+        ECP_FILE,
+        "--mpi",
+        str(mpi),
+        "--guess",
+        "hcore",
+        "--hfref",
+        "--scf-cycles",
+        "1000",
+        "--cm",
+        chargemodel,
+        "--notrahf",
+    ]
+
+
+def run_calculation(
+    symbol: str,
+    element_path: Path,
+    chargemodel: str,
+    binaries: dict[str, str],
+    mpi: int,
+    verb: bool,
+    dry_run: bool = False,
+    timings: Timings | None = None,
+    guess: Path | None = None,
+) -> None:
+    """
+    Run qvSZP, ORCA and orca_2json in the (prepared) element directory.
+
+    Args:
+        symbol (str): Lower case element symbol.
+        element_path (Path): Directory in which the calculation is run.
+        chargemodel (str): Charge model passed to qvSZP.
+        binaries (dict): Paths of the "qvSZP" and "orca" binaries.
+        mpi (int): Number of MPI ranks used by ORCA.
+        verb (bool): Verbose output.
+        dry_run (bool): Only perform the input generation with qvSZP.
+        timings (Timings | None): Records the resource usage of each program.
+        guess (Path | None): Converged gbw file used as initial guess of the SCF
+                             instead of the core Hamiltonian (see warm_start).
+    """
+    timings = timings if timings is not None else Timings()
+    try:
+        process = timings.run(
+            symbol,
+            "qvSZP",
+            qvszp_command(binaries["qvSZP"], symbol + ".xyz", chargemodel, mpi),
+            element_path,
+            outputs=[element_path / "hf_q-vSZP.inp"],
+        )
+    except sp.CalledProcessError as err:
+        print(f"Error in qvSZP execution:\n{err.stderr}")
+        raise CalculationError(f"qvSZP failed for {symbol}") from err
+    if verb:
+        print("Output: ", process.stdout)
+    if dry_run:
+        return
+    if guess is not None:
+        warm_start(element_path / "hf_q-vSZP.inp", guess)
+
+    with open(element_path / "orca.out", "w", encoding="utf8") as f:
+        try:
+            process = timings.run(
+                symbol,
+                "ORCA",
+                [binaries["orca"], "hf_q-vSZP.inp"],
+                element_path,
+                stdout=f,
+                outputs=[element_path / "hf_q-vSZP.gbw"],
+                details=lambda: scf_details(element_path / "orca.out", guess),
+            )
+        except sp.CalledProcessError as err:
+            print(f"Error in ORCA execution:\n{err.stderr}")
+            raise CalculationError(f"ORCA failed for {symbol}") from err
+    f.close()
+
+    with open(element_path / "orca_2json.out", "w", encoding="utf8") as f:
+        try:
+            process = timings.run(
+                symbol,
+                "orca_2json",
+                ["orca_2json", "hf_q-vSZP.gbw"],
+                element_path,
+                stdout=f,
+                outputs=[element_path / "hf_q-vSZP.json"],
+            )
+        except sp.CalledProcessError as err:
+            print(f"Error in orca_2json execution:\n{err.stderr}")
+            raise CalculationError(f"orca_2json failed for {symbol}") from err
+    f.close()
+
+
+def scf_cycles(orca_out: Path) -> int | None:
+    """
+    Number of SCF cycles of a converged ORCA calculation (None if not converged).
+    """
+    if not orca_out.is_file():
+        return None
+    with open(orca_out, encoding="utf8", errors="replace") as f:
+        match = SCF_CONVERGED.search(f.read())
+    f.close()
+    return int(match.group(1)) if match else None
+
+
+def scf_details(orca_out: Path, guess: Path | None) -> dict[str, Any]:
+    """
+    SCF cycles and initial guess of an ORCA run (recorded in the timings).
+    """
+    return {
+        "scf_cycles": scf_cycles(orca_out),
+        "guess": "hcore" if guess is None else str(guess.parent),
+    }
+
+
+def warm_start(inpfile: Path, guess: Path) -> None:
+    """
+    Copy a converged gbw file next to the ORCA input as GUESS_FILE and
+    let ORCA read the initial orbitals from it (MORead) instead of using
+    the core Hamiltonian guess written by qvSZP.
+    """
+    shutil.copyfile(guess, inpfile.parent / GUESS_FILE)
+    with open(inpfile, encoding="utf8") as f:
+        lines = f.read().splitlines(keepends=True)
+    f.close()
+    hcore = re.compile(r"\bguess\s+hcore\b", re.IGNORECASE)
+    if any(hcore.search(line) for line in lines):
+        lines = [hcore.sub("guess moread", line) for line in lines]
+    else:
+        lines.insert(0, "! MORead\n")
+    # %moinp is placed in front of the first block or the coordinates
+    first_block = next(
+        (i for i, line in enumerate(lines) if line.lstrip()[:1] in ("%", "*")),
+        len(lines),
+    )
+    lines.insert(first_block, f'%moinp "{GUESS_FILE}"\n')
+    with open(inpfile, "w", encoding="utf8") as f:
+        f.write("".join(lines))
+    f.close()
+
+
+def read_ext_charges(element_path: Path) -> tuple[float, float] | None:
+    """
+    External charge and CN of a calculation (None if the CEH charges were used).
+    """
+    chargefile = element_path / "ext.charges"
+    if not chargefile.is_file():
+        return None
+    with open(chargefile, encoding="utf8") as f:
+        q, cn = f.read().split()[:2]
+    f.close()
+    return float(q), float(cn)
+
+
+def find_guess(
+    q_cn: dict[str, float] | None, candidates: Iterable[Path]
+) -> Path | None:
+    """
+    gbw file of the finished calculation among the candidate directories whose
+    external charge and CN are closest to `q_cn`. Only calculations with
+    a converged SCF and a complete JSON file are used.
+
+    Args:
+        q_cn (dict | None): External charge and CN or None (CEH charges).
+        candidates (Iterable[Path]): Directories of previous calculations of the
+                                     same element.
+
+    Returns:
+        Path | None: The gbw file or None if no candidate is available.
+    """
+    best: tuple[float, Path] | None = None
+    for path in candidates:
+        if not (
+            (path / GBW_FILE).is_file()
+            and scf_cycles(path / "orca.out") is not None
+            and json_complete(path / "hf_q-vSZP.json")
+        ):
+            continue
+        point = read_ext_charges(path)
+        if q_cn is None or point is None:
+            same_model = q_cn is None and point is None
+            distance = 0.0 if same_model else OTHER_CHARGE_MODEL_DISTANCE
+        else:
+            distance = abs(point[0] - q_cn["q"]) + abs(point[1] - q_cn["CN"])
+        if best is None or distance < best[0]:
+            best = (distance, path / GBW_FILE)
+    return best[1] if best is not None else None
+
+
+def scratch_root(scratch: str) -> Path:
+    """
+    Root of the scratch directories: `scratch` or, if empty, $TMPDIR
+    (or the system default for temporary files).
+    """
+    return Path(scratch or tempfile.gettempdir()).expanduser().resolve()
+
+
+def stage_in(element_path: Path, symbol: str, scratch: str) -> Path:
+    """
+    Create a scratch directory for an element and copy its input files
+    (see INPUT_FILES) into it.
+    """
+    root = scratch_root(scratch)
+    root.mkdir(parents=True, exist_ok=True)
+    workdir = Path(tempfile.mkdtemp(prefix=f"{symbol}_", dir=root))
+    for name in INPUT_FILES:
+        inpfile = element_path / name.format(symbol=symbol)
+        if inpfile.is_file():
+            shutil.copy(inpfile, workdir)
+    return workdir
+
+
+def stage_out(workdir: Path, element_path: Path, keep_gbw: bool = False) -> None:
+    """
+    Copy the artifacts (see SCRATCH_ARTIFACTS and, if `keep_gbw`, the gbw file)
+    from the scratch directory back to the element directory and remove the
+    scratch directory. Each file is replaced atomically.
+    """
+    artifacts = SCRATCH_ARTIFACTS + ((GBW_FILE,) if keep_gbw else ())
+    try:
+        for name in artifacts:
+            if not (workdir / name).is_file():
+                continue
+            fd, tmpname = tempfile.mkstemp(dir=element_path, suffix=".tmp")
+            os.close(fd)
+            try:
+                shutil.copyfile(workdir / name, tmpname)
+                os.replace(tmpname, element_path / name)
+            except BaseException:
+                Path(tmpname).unlink(missing_ok=True)
+                raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextmanager
+def scratch_directory(
+    element_path: Path, symbol: str, scratch: str | None, keep_gbw: bool = False
+) -> Iterator[Path]:
+    """
+    Directory in which the programs are run. If `scratch` is None, this is the
+    element directory. Otherwise, the inputs are staged into a node-local scratch
+    directory (see stage_in) and the artifacts are copied back when the context
+    is left, also if the calculation fails (see stage_out).
+    """
+    if scratch is None:
+        yield element_path
+        return
+    workdir = stage_in(element_path, symbol, scratch)
+    try:
+        yield workdir
+    finally:
+        stage_out(workdir, element_path, keep_gbw)
+
+
+def save_result(
+    element_path: Path, averages: np.ndarray, kmat: np.ndarray | None
+) -> None:
+    """
+    Store the result of an element atomically in RESULT_FILE,
+    i.e., the file either contains the complete result or does not exist.
+    """
+    fd, tmpname = tempfile.mkstemp(dir=element_path, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if kmat is None:
+                np.savez(f, averages=averages)
+            else:
+                np.savez(f, averages=averages, kmat=kmat)
+        os.replace(tmpname, element_path / RESULT_FILE)
+    except BaseException:
+        Path(tmpname).unlink(missing_ok=True)
+        raise
+
+
+def load_result(element_path: Path) -> tuple[np.ndarray, np.ndarray | None] | None:
+    """
+    Load the result of an element stored by save_result.
+    Returns None if no valid result is present.
+    """
+    try:
+        with np.load(element_path / RESULT_FILE) as data:
+            return data["averages"], data["kmat"] if "kmat" in data else None
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def json_complete(jsonfile: Path) -> bool:
+    """
+    Check whether the JSON file written by orca_2json exists and is complete,
+    i.e., its last non-blank character closes the top-level object.
+    """
+    if not jsonfile.is_file() or jsonfile.stat().st_size == 0:
+        return False
+    with open(jsonfile, "rb") as f:
+        f.seek(max(0, jsonfile.stat().st_size - 64))
+        tail = f.read()
+    f.close()
+    return tail.rstrip().endswith(b"}")
@@ -0,0 +1,190 @@
+"""
+This module contains the cost model used to schedule a sweep: the expected
+runtime of each element (from the runtimes of previous sweeps or, if not
+available, from its number of AOs), the launch order (longest first), the number
+of MPI ranks per element and a core budget shared by the concurrent elements.
+
+The runtimes of previous sweeps are kept in runtime_history.json as core seconds
+(wall time of qvSZP, ORCA and orca_2json times the number of ranks) per element.
+"""
+
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+from inthandler import valence_layout
+
+# runtimes of previous sweeps
+RUNTIME_HISTORY_FILE = "runtime_history.json"
+# stages of the calculation whose wall time enters the history
+CALCULATION_STAGES: tuple[str, ...] = ("qvSZP", "ORCA", "orca_2json")
+# number of AOs per AO layout in q-vSZP (see inthandler.VALENCE_RANGES)
+LAYOUT_NAOS: dict[str, int] = {"general": 9, "frra": 20, "lnac": 29}
+# number of AOs of H and He (no d shell)
+NAO_HHE = 4
+
+
+def ao_count(ati: int) -> int:
+    """
+    Number of AOs of an element in q-vSZP.
+    """
+    return NAO_HHE if ati <= 2 else LAYOUT_NAOS[valence_layout(ati)]
+
+
+def model_cost(ati: int) -> float:
+    """
+    Relative cost of an element from its number of AOs
+    (the number of 2-el integrals grows with nao^4).
+    """
+    return float(ao_count(ati)) ** 4
+
+
+def load_history(history_file: Path) -> dict[str, float]:
+    """
+    Core seconds per element of previous sweeps (empty if there is no history).
+    """
+    if not history_file.is_file():
+        return {}
+    with open(history_file, encoding="utf8") as f:
+        history = json.load(f)
+    f.close()
+    return {symbol: float(entry["core_s"]) for symbol, entry in history.items()}
+
+
+def update_history(
+    history_file: Path, records: list[dict[str, Any]], ranks: dict[str, int]
+) -> None:
+    """
+    Add the calculation times of a sweep (see instrument.Timings) to the history.
+    Only elements whose calculation stages all succeeded are stored, elements
+    that were not calculated keep their previous entry.
+
+    Args:
+        history_file (Path): History file (see RUNTIME_HISTORY_FILE).
+        records (list[dict]): Stage records of the sweep.
+        ranks (dict[str, int]): Number of MPI ranks used per element.
+    """
+    walls: dict[str, float] = {}
+    failed: set[str] = set()
+    for record in records:
+        if record["stage"] not in CALCULATION_STAGES:
+            continue
+        walls[record["element"]] = walls.get(record["element"], 0.0) + record["wall_s"]
+        if record["status"] != "ok":
+            failed.add(record["element"])
+    if not set(walls) - failed:
+        return
+    history: dict[str, dict[str, float]] = {}
+    if history_file.is_file():
+        with open(history_file, encoding="utf8") as f:
+            history = json.load(f)
+        f.close()
+    for symbol, wall in walls.items():
+        if symbol not in failed:
+            history[symbol] = {
+                "wall_s": wall,
+                "ranks": ranks[symbol],
+                "core_s": wall * ranks[symbol],
+            }
+    tmpfile = history_file.parent / f".{history_file.name}.{os.getpid()}"
+    with open(tmpfile, "w", encoding="utf8") as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+    f.close()
+    os.replace(tmpfile, history_file)
+
+
+def estimate_costs(
+    elements: list[int], history: dict[str, float], symbols: dict[int, str]
+) -> dict[int, float]:
+    """
+    Expected cost (core seconds) of each element. Elements without history are
+    estimated with the AO-count model, scaled to the history by the median ratio
+    of both for the elements that have a history.
+
+    Args:
+        elements (list[int]): Atomic numbers of the elements.
+        history (dict[str, float]): Core seconds per element symbol (see load_history).
+        symbols (dict[int, str]): Element symbol per atomic number.
+
+    Returns:
+        dict[int, float]: Cost per atomic number.
+    """
+    ratios = sorted(
+        history[symbol] / model_cost(ati)
+        for ati, symbol in symbols.items()
+        if ati > 0 and symbol in history
+    )
+    scale = ratios[len(ratios) // 2] if ratios else 1.0
+    return {ati: history.get(symbols[ati], scale * model_cost(ati)) for ati in elements}
+
+
+def longest_first(costs: dict[int, float]) -> list[int]:
+    """
+    Elements in descending order of their cost, so that the most expensive
+    elements do not end up at the tail of a sweep.
+    """
+    return sorted(costs, key=lambda ati: costs[ati], reverse=True)
+
+
+def assign_ranks(costs: dict[int, float], max_ranks: int) -> dict[int, int]:
+    """
+    Number of MPI ranks per element in proportion to its share of the cost of
+    the most expensive element (at least 1, at most `max_ranks`).
+    """
+    max_cost = max(costs.values(), default=0.0)
+    if max_cost <= 0.0:
+        return {ati: max_ranks for ati in costs}
+    return {
+        ati: min(max_ranks, max(1, math.ceil(max_ranks * cost / max_cost)))
+        for ati, cost in costs.items()
+    }
+
+
+def balance_shards(costs: dict[int, float], nshards: int) -> list[list[int]]:
+    """
+    Distribute the elements over `nshards` groups with similar total cost
+    (longest processing time first: each element goes to the currently
+    cheapest group).
+    """
+    nshards = max(1, min(nshards, len(costs)))
+    shards: list[list[int]] = [[] for _ in range(nshards)]
+    totals = [0.0] * nshards
+    for ati in longest_first(costs):
+        ishard = totals.index(min(totals))
+        shards[ishard].append(ati)
+        totals[ishard] += costs[ati]
+    return shards
+
+
+class CoreBudget:
+    """
+    Counting semaphore over the cores of a node: an element with n MPI ranks
+    waits until n cores are free. Thread-safe.
+
+    Args:
+        cores (int): Total number of cores.
+    """
+
+    def __init__(self, cores: int) -> None:
+        self.cores = cores
+        self.free = cores
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, ncores: int) -> Iterator[None]:
+        """
+        Hold `ncores` cores (at most all cores) while the block runs.
+        """
+        ncores = min(ncores, self.cores)
+        with self._condition:
+            self._condition.wait_for(lambda: self.free >= ncores)
+            self.free -= ncores
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.free += ncores
+                self._condition.notify_all()
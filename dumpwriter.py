@@ -0,0 +1,134 @@
+"""
+This module contains the routines for writing the per-element dumps
+of the 2-el integrals (<element>_integrals_<order>.dat/.npz),
+optionally in a background thread.
+"""
+
+import queue
+import threading
+from pathlib import Path
+import numpy as np
+
+DUMP_FORMATS = ("text", "binary", "none")
+# format of a single row of the text dump
+ROW_FORMAT = "%3i %3i %3i %3i %8.5f\n"
+# number of rows formatted at once
+CHUNK_ROWS = 1 << 14
+
+
+def dump_file(outprefix: Path, dump_format: str) -> Path:
+    """
+    File name of a dump for the given prefix and format.
+    """
+    suffix = ".npz" if dump_format == "binary" else ".dat"
+    return outprefix.parent / (outprefix.name + suffix)
+
+
+def write_text_dump(
+    outfile: Path, indices: np.ndarray, values: np.ndarray, header: str
+) -> None:
+    """
+    Write the 2-el integral rows as text. The output is identical to
+    np.savetxt(outfile, rows, fmt="%3i %3i %3i %3i %8.5f", header=header),
+    but the rows are formatted chunk-wise with a single %-operation per chunk.
+    """
+    with open(outfile, "w", encoding="utf8") as f:
+        f.write("# " + header.replace("\n", "\n# ") + "\n")
+        for start in range(0, values.shape[0], CHUNK_ROWS):
+            rows = np.column_stack(
+                (
+                    indices[start : start + CHUNK_ROWS],
+                    values[start : start + CHUNK_ROWS],
+                )
+            )
+            f.write(ROW_FORMAT * rows.shape[0] % tuple(rows.ravel().tolist()))
+    f.close()
+
+
+def write_binary_dump(
+    outfile: Path, indices: np.ndarray, values: np.ndarray, header: str
+) -> None:
+    """
+    Write the 2-el integral rows as compact binary .npz file
+    with the arrays "indices" (int32, shape (n, 4)), "values" and "header".
+    """
+    with open(outfile, "wb") as f:
+        np.savez(
+            f,
+            indices=np.asarray(indices, dtype=np.int32),
+            values=np.asarray(values),
+            header=np.array(header),
+        )
+    f.close()
+
+
+def write_dump(
+    outfile: Path,
+    indices: np.ndarray,
+    values: np.ndarray,
+    header: str,
+    dump_format: str,
+) -> None:
+    """
+    Write a dump of the 2-el integral rows in the given format.
+    """
+    if dump_format == "text":
+        write_text_dump(outfile, indices, values, header)
+    elif dump_format == "binary":
+        write_binary_dump(outfile, indices, values, header)
+    elif dump_format != "none":
+        raise ValueError(f"Unknown dump format {dump_format}.")
+
+
+class DumpWriter:
+    """
+    Writes the dumps in a background thread so that writing overlaps
+    with the processing of the next element.
+    Errors of the writer thread are raised by close().
+    """
+
+    def __init__(self, maxsize: int = 8) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._errors: list[BaseException] = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                write_dump(*job)
+            except Exception as err:  # pylint: disable=broad-except
+                print(f"Error while writing {job[0]}: {err}")
+                self._errors.append(err)
+
+    def submit(
+        self,
+        outfile: Path,
+        indices: np.ndarray,
+        values: np.ndarray,
+        header: str,
+        dump_format: str,
+    ) -> None:
+        """
+        Queue a dump. Blocks if too many dumps are pending.
+        """
+        if dump_format != "none":
+            self._queue.put((outfile, indices, values, header, dump_format))
+
+    def close(self) -> None:
+        """
+        Wait until all dumps are written.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def __enter__(self) -> "DumpWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,42 +1,93 @@
 """
 This module contains a function that obtains a NumPy array
 and writes a Fortran code for an equivalent array.
+
+The output is built in one buffer and only written if it differs from the
+existing file, so that unchanged files do not trigger a rebuild of g-xTB.
 """
 
+from pathlib import Path
+import numpy as np
+
+
+def write_if_changed(content: str | bytes, outfile: str | Path) -> bool:
+    """
+    Write `content` to `outfile` unless the file already has this content.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    path = Path(outfile)
+    data = content.encode("utf8") if isinstance(content, str) else content
+    if path.is_file() and path.stat().st_size == len(data):
+        if path.read_bytes() == data:
+            return False
+    path.write_bytes(data)
+    return True
+
+
+def fortran_array_code(array: np.ndarray) -> str:
+    """
+    Fortran assignments gmunu(j,i) = ... for all elements i > 0.
+    """
+    return "".join(
+        f"gmunu({j + 1},{i}) = {array[j, i]:.8f}\n"
+        for i in range(1, array.shape[1])
+        for j in range(array.shape[0])
+    )
+
 
-def write_fortran_array(array, outfile):
+def write_fortran_array(array, outfile) -> bool:
     """
     Write a NumPy array to a Fortran code so that it can be used in the
     Fortran code for the GP3 method.
+    Returns True if the file was (re)written.
     """
-    # open the output file
-    with open(outfile, "w", encoding="utf8") as f:
-        for i in range(array.shape[1]):
-            if i == 0:
-                continue
-            for j in range(array.shape[0]):
-                print(f"gmunu({j + 1},{i}) = {array[j, i]:.8f}", file=f)
-    f.close()
+    return write_if_changed(fortran_array_code(array), outfile)
 
 
-def write_fortran_data(array, outfile: str) -> None:
+def fortran_data_code(array: np.ndarray) -> str:
+    """
+    Fortran declaration and data statements of gmunu for all elements i > 0.
+    """
+    lines = [
+        f"real(wp), save, dimension({array.shape[0]}, {array.shape[1] - 1}) :: gmunu\n"
+    ]
+    for i in range(1, array.shape[1]):
+        lines.append(f"data gmunu(:,{i}) / &\n")
+        lines.append(
+            "& " + ", ".join(f"{value:.7f}_wp" for value in array[0:9, i]) + " /\n"
+        )
+    return "".join(lines)
+
+
+def write_fortran_data(array, outfile: str) -> bool:
     """
     Write a NumPy array to a Fortran data statement so that it can be used in the
     Fortran code for the GP3 method.
+    Returns True if the file was (re)written.
     """
-    with open(outfile, "w", encoding="utf8") as f:
-        print(
-            f"real(wp), save, dimension({array.shape[0]}, {array.shape[1] - 1}) :: gmunu",
-            file=f,
-        )
-        for i in range(array.shape[1]):
-            if i == 0:
-                continue
-            print(f"data gmunu(:,{i}) / &", file=f)
-            for j in range(0, 9):
-                if j == 0:
-                    print(f"& {array[j, i]:.7f}_wp, ", end="", file=f)
-                elif j == 8:
-                    print(f"{array[j, i]:.7f}_wp /", file=f)
-                else:
-                    print(f"{array[j, i]:.7f}_wp, ", end="", file=f)
+    return write_if_changed(fortran_data_code(array), outfile)
+
+
+def write_fortran_binary(array: np.ndarray, outfile: str) -> bool:
+    """
+    Write gmunu (all elements i > 0) as Fortran stream binary file that can be
+    read at runtime instead of compiling the data statements.
+    Layout (native byte order): two 32-bit integers n1, n2 followed by
+    n1 * n2 64-bit reals in Fortran (column-major) order. It can be read with
+
+        integer :: u, n1, n2
+        real(wp), allocatable :: gmunu(:,:)
+        open(newunit=u, file="onecxcints.bin", access="stream", &
+           & form="unformatted", status="old")
+        read(u) n1, n2
+        allocate(gmunu(n1, n2))
+        read(u) gmunu
+        close(u)
+
+    Returns True if the file was (re)written.
+    """
+    gmunu = np.asarray(array[:, 1:], dtype=np.float64)
+    header = np.array(gmunu.shape, dtype=np.int32).tobytes()
+    return write_if_changed(header + gmunu.tobytes(order="F"), outfile)
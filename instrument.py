@@ -0,0 +1,375 @@
+"""
+This module contains the per-stage instrumentation of the calculations:
+wall time, CPU time, peak RSS and output file sizes of each stage
+(qvSZP, ORCA, orca_2json, parsing, averaging) of each element.
+
+External programs are run with os.wait4 so that the CPU time of the child
+process and its descendants is recorded, which also works if several elements
+are processed concurrently. ru_maxrss of a forked child includes the RSS of this
+process, so the peak RSS is instead polled from /proc while the program runs:
+max_rss_bytes is the largest total RSS of the whole process tree (e.g. the ORCA
+driver with orca_scf and all MPI ranks) seen by the polls, or the largest peak
+RSS of a single process of the tree if that is higher. It is a lower bound of
+the memory needed by the program (see wait_polling_rss) and None without /proc.
+The records of a run are written to timings.json and timings.csv.
+"""
+
+import csv
+import json
+import os
+import subprocess as sp
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, TextIO
+
+# prefix of the per-run report files (<prefix>.json, <prefix>.csv)
+TIMINGS_PREFIX = "timings"
+# longest interval between two polls of the peak RSS of an external program in s
+RSS_POLL_INTERVAL = 0.1
+# columns of a stage record
+FIELDS: tuple[str, ...] = (
+    "element",
+    "stage",
+    "status",
+    "start_s",
+    "wall_s",
+    "cpu_s",
+    "max_rss_bytes",
+    "output_bytes",
+    "scf_cycles",
+    "guess",
+)
+
+
+def rss_bytes(maxrss: int) -> int:
+    """
+    Convert ru_maxrss to bytes (it is given in bytes on macOS and in kB on Linux).
+    """
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def max_rss() -> int | None:
+    """
+    Peak resident set size of this process in bytes
+    (None if not available on this platform).
+    """
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return rss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _read_proc(procfile: str) -> str | None:
+    """
+    Content of a file in /proc (None if the process has exited or there is
+    no /proc).
+    """
+    try:
+        with open(procfile, encoding="utf8") as f:
+            content = f.read()
+        f.close()
+    except OSError:
+        return None
+    return content
+
+
+def _list_proc(directory: str) -> list[str]:
+    """
+    Entries of a directory in /proc (empty if the process has exited or there is
+    no /proc).
+    """
+    try:
+        return os.listdir(directory)
+    except OSError:
+        return []
+
+
+def process_tree(pid: int) -> list[int]:
+    """
+    PIDs of a process and all its descendants (e.g. orca_scf and the MPI ranks
+    started by the ORCA driver). The children are taken from
+    /proc/<pid>/task/<tid>/children if the kernel provides it, otherwise from
+    the parent PIDs in /proc/<pid>/stat of all processes.
+    """
+    own = os.getpid()
+    if os.path.isfile(f"/proc/{own}/task/{own}/children"):
+        tree = [pid]
+        for parent in tree:
+            for task in _list_proc(f"/proc/{parent}/task"):
+                content = _read_proc(f"/proc/{parent}/task/{task}/children")
+                tree.extend(int(child) for child in (content or "").split())
+        return tree
+    children: dict[int, list[int]] = {}
+    for entry in _list_proc("/proc"):
+        content = _read_proc(f"/proc/{entry}/stat") if entry.isdigit() else None
+        if content is None:
+            continue
+        # the command name in parentheses may contain blanks
+        ppid = int(content.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, []))
+    return tree
+
+
+def tree_rss(pid: int) -> int | None:
+    """
+    Resident set size of a process tree in bytes: the larger of the current
+    total RSS (VmRSS) of all its processes and the peak RSS (VmHWM) of any
+    single one of them. None if /proc is not available or the process has
+    already exited.
+    """
+    total, peak, found = 0, 0, False
+    for member in process_tree(pid):
+        content = _read_proc(f"/proc/{member}/status")
+        if content is None:
+            continue
+        for line in content.splitlines():
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1]) * 1024
+                found = True
+            elif line.startswith("VmHWM:"):
+                peak = max(peak, int(line.split()[1]) * 1024)
+    return max(total, peak) if found else None
+
+
+def wait_polling_rss(pid: int) -> tuple[int, float, int | None]:
+    """
+    Wait for a child process like os.wait4 and poll the RSS of its process tree
+    (see tree_rss) meanwhile. The poll interval grows from 1 ms to
+    RSS_POLL_INTERVAL. The result is a lower bound of the peak RSS of the tree:
+    processes that start and exit between two polls and a peak of the total RSS
+    between two polls are missed.
+
+    Returns:
+        tuple: Exit status, CPU time (user + system, including the waited-for
+               descendants) in s and peak RSS in bytes (None if it could not be
+               read).
+    """
+    peak = None
+    interval = 0.001
+    while True:
+        rss = tree_rss(pid)
+        if rss is not None:
+            peak = rss if peak is None else max(peak, rss)
+        wpid, status, rusage = os.wait4(pid, os.WNOHANG)
+        if wpid == pid:
+            return status, rusage.ru_utime + rusage.ru_stime, peak
+        time.sleep(interval)
+        interval = min(2.0 * interval, RSS_POLL_INTERVAL)
+
+
+def run_process(
+    command: list[str], cwd: Path, stdout: TextIO | None = None
+) -> tuple[sp.CompletedProcess, dict[str, float | int | None]]:
+    """
+    Run an external program like subprocess.run(..., text=True)
+    and return the resource usage of the child process.
+
+    Args:
+        command (list[str]): Command line.
+        cwd (Path): Working directory.
+        stdout (TextIO | None): File to which the output is written.
+                                If None, the output is captured.
+
+    Returns:
+        tuple: The completed process (with the captured stdout/stderr) and its
+               CPU time (user + system, cpu_s) and peak RSS of its process tree
+               (max_rss_bytes, None without /proc, see wait_polling_rss).
+    """
+    # the output is buffered in temporary files instead of pipes,
+    # since os.wait4 cannot be combined with Popen.communicate
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        process = sp.Popen(command, cwd=cwd, stdout=stdout or out, stderr=err)
+        if hasattr(os, "wait4"):
+            status, cpu, peak = wait_polling_rss(process.pid)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            usage: dict[str, float | int | None] = {
+                "cpu_s": cpu,
+                "max_rss_bytes": peak,
+            }
+        else:
+            process.wait()
+            usage = {"cpu_s": None, "max_rss_bytes": None}
+        out.seek(0)
+        err.seek(0)
+        output = out.read().decode("utf8", errors="replace")
+        errors = err.read().decode("utf8", errors="replace")
+    return sp.CompletedProcess(command, process.returncode, output, errors), usage
+
+
+def output_size(outputs: list[Path]) -> int:
+    """
+    Total size of the existing output files in bytes.
+    """
+    return sum(path.stat().st_size for path in outputs if path.is_file())
+
+
+class Timings:
+    """
+    Collects the stage records of a run. Thread-safe, so that concurrently
+    processed elements can share one instance.
+    """
+
+    def __init__(self) -> None:
+        self.records: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(
+        self, element: str, stage: str, outputs: list[Path] | None = None
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Time a stage of an element. The yielded record can be updated with the
+        resource usage of an external program (see run_process). Otherwise,
+        the CPU time of the current thread and the peak RSS of this process are
+        recorded. The record is also stored if the stage fails.
+        """
+        record: dict[str, Any] = {"element": element, "stage": stage}
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        record["status"] = "failed"
+        try:
+            yield record
+            record["status"] = "ok"
+        finally:
+            record["start_s"] = start - self._start
+            record["wall_s"] = time.perf_counter() - start
+            record.setdefault("cpu_s", time.thread_time() - cpu_start)
+            record.setdefault("max_rss_bytes", max_rss())
+            record["output_bytes"] = output_size(outputs or [])
+            with self._lock:
+                self.records.append(record)
+
+    def run(
+        self,
+        element: str,
+        stage: str,
+        command: list[str],
+        cwd: Path,
+        stdout: TextIO | None = None,
+        outputs: list[Path] | None = None,
+        details: Callable[[], dict[str, Any]] | None = None,
+    ) -> sp.CompletedProcess:
+        """
+        Run an external program (see run_process) as a timed stage.
+        `details` is called after the program has finished, its values
+        (e.g. the number of SCF cycles) are added to the record.
+        Raises subprocess.CalledProcessError if the program fails.
+        """
+        with self.stage(element, stage, outputs) as record:
+            process, usage = run_process(command, cwd, stdout)
+            record.update(usage)
+            if details is not None:
+                record.update(details())
+            process.check_returncode()
+        return process
+
+    def totals(self, key: str) -> list[tuple[str, float]]:
+        """
+        Total wall time per element or stage (`key`), in descending order.
+        """
+        totals: dict[str, float] = {}
+        for record in self.records:
+            totals[record[key]] = totals.get(record[key], 0.0) + record["wall_s"]
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def scf_statistics(self) -> dict[str, dict[str, float]]:
+        """
+        Number of runs, mean SCF cycles and mean wall time of the ORCA runs
+        started from the core Hamiltonian ("hcore") and from converged orbitals
+        ("warm"). If both are present, the estimated time saved by the warm
+        starts is given in "saved".
+        """
+        statistics: dict[str, dict[str, float]] = {}
+        for label in ("hcore", "warm"):
+            group = [
+                record
+                for record in self.records
+                if record.get("scf_cycles") is not None
+                and (record["guess"] == "hcore") == (label == "hcore")
+            ]
+            if group:
+                statistics[label] = {
+                    "runs": len(group),
+                    "mean_cycles": sum(r["scf_cycles"] for r in group) / len(group),
+                    "mean_wall_s": sum(r["wall_s"] for r in group) / len(group),
+                }
+        if "hcore" in statistics and "warm" in statistics:
+            cold, warm = statistics["hcore"], statistics["warm"]
+            statistics["saved"] = {
+                "cycles": (cold["mean_cycles"] - warm["mean_cycles"]) * warm["runs"],
+                "wall_s": (cold["mean_wall_s"] - warm["mean_wall_s"]) * warm["runs"],
+            }
+        return statistics
+
+    def summary(self, nmax: int = 5) -> str:
+        """
+        Table of the slowest elements, the total time per stage and
+        the slowest single stages.
+        """
+        lines = [f"Slowest elements (of {len(self.totals('element'))}):"]
+        lines += [
+            f"  {element:<4} {wall:10.2f} s"
+            for element, wall in self.totals("element")[:nmax]
+        ]
+        lines.append("Total time per stage:")
+        lines += [
+            f"  {stage:<12} {wall:10.2f} s" for stage, wall in self.totals("stage")
+        ]
+        lines.append("Slowest stages:")
+        slowest = sorted(
+            self.records, key=lambda record: record["wall_s"], reverse=True
+        )
+        for record in slowest[:nmax]:
+            rss = record["max_rss_bytes"]
+            lines.append(
+                f"  {record['element']:<4} {record['stage']:<12} "
+                + f"{record['wall_s']:10.2f} s "
+                + (f"{rss / 2**20:10.1f} MiB" if rss is not None else "")
+            )
+        statistics = self.scf_statistics()
+        for label in ("hcore", "warm"):
+            if label in statistics:
+                group = statistics[label]
+                lines.append(
+                    f"SCF from {label} guess: {group['runs']:.0f} run(s), "
+                    + f"{group['mean_cycles']:.1f} cycles and "
+                    + f"{group['mean_wall_s']:.2f} s on average"
+                )
+        if "saved" in statistics:
+            lines.append(
+                f"Saved by warm starts: {statistics['saved']['cycles']:.0f} cycles, "
+                + f"{statistics['saved']['wall_s']:.1f} s (estimated)"
+            )
+        return "\n".join(lines)
+
+    def write(self, prefix: str = TIMINGS_PREFIX) -> None:
+        """
+        Write the records to <prefix>.json and <prefix>.csv.
+        """
+        records = sorted(self.records, key=lambda record: record["start_s"])
+        with open(prefix + ".json", "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "records": records,
+                    "elements": dict(self.totals("element")),
+                    "stages": dict(self.totals("stage")),
+                    "scf": self.scf_statistics(),
+                },
+                f,
+                indent=2,
+            )
+        f.close()
+        with open(prefix + ".csv", "w", encoding="utf8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+        f.close()
@@ -4,131 +4,375 @@ The indices are swapped to match the order of the integrals in the GP3 method.
 Relevant integrals are separated and written into a file in the format required by GP3.
 """
 
-import json
+import os
+import re
+import tempfile
 from pathlib import Path
 import numpy as np
+from packedints import PackedIntegrals
+from aoorder import ao_permutation, permute_indices
+from dumpwriter import DumpWriter, dump_file, write_dump
 
+# maximum number of AOs per element in q-vSZP (Ln's/Ac's)
+NAO_MAX = 29
+# threshold below which an exchange integral is counted as zero
+ZERO_THRESHOLD = 1e-7
 
-def jsonhandler_resorting_legacy(inpfile: Path, outprefix: str, verb: bool):
+# key of the 2-el integral block in the JSON file written by orca_2json
+AO_PQRS_KEY = '"AO_PQRS"'
+# number of characters read from the JSON file at once
+CHUNK_SIZE = 1 << 20
+# initial number of rows of the integral arrays (grown on demand)
+INITIAL_ROWS = 1 << 14
+# end of AO_PQRS[0]: closing bracket of the last row followed by the one of the list
+_END_OF_BLOCK = re.compile(r"\]\s*\]")
+# brackets and commas are replaced by blanks so that only numbers remain
+_SEPARATORS = str.maketrans("[],", "   ")
+
+
+def exchange_mask(indices: np.ndarray) -> np.ndarray:
     """
-    Read in the JSON file and write the integrals into a numpy array and a file.
-    Indices are swapped to match the order of the integrals in the GP3 method.
+    Mask of the rows that are exchange-type integrals (ij|ij) in any
+    symmetry-equivalent index order, i.e. (ij|ij), (ji|ij), (ij|ji) and (ji|ji).
     """
-    # Open the JSON file
+    p, q, r, s = indices[:, 0], indices[:, 1], indices[:, 2], indices[:, 3]
+    return ((p == r) & (q == s)) | ((p == s) & (q == r))
+
+
+def read_ao_pqrs(
+    inpfile: Path, chunk_size: int = CHUNK_SIZE, exchange_only: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Read the rows of data["Molecule"]["2elIntegrals"]["AO_PQRS"][0] from the JSON file
+    without building the full JSON tree.
+    The file is read in chunks of `chunk_size` characters and the rows are parsed
+    directly into preallocated NumPy arrays.
+
+    Args:
+        inpfile (Path): JSON file written by orca_2json.
+        chunk_size (int): Number of characters read at once.
+        exchange_only (bool): Only keep the exchange-type integrals (see exchange_mask).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: AO indices p, q, r, s with shape (n, 4)
+                                       and integral values with shape (n,).
+    """
+    indices = np.empty((INITIAL_ROWS, 4), dtype=np.int32)
+    values = np.empty(INITIAL_ROWS)
+    nrows = 0
+
     with open(inpfile, encoding="utf8") as json_file:
-        data = json.load(json_file)
+        # Skip everything in front of the first row of AO_PQRS[0]
+        buffer = ""
+        while True:
+            chunk = json_file.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"No {AO_PQRS_KEY} block found in {inpfile}.")
+            buffer += chunk
+            pos = buffer.find(AO_PQRS_KEY)
+            if pos >= 0 and "[" in buffer[pos:]:
+                buffer = buffer[buffer.index("[", pos) :]
+                break
+            # keep the tail in case the key is split between two chunks
+            buffer = buffer[pos:] if pos >= 0 else buffer[-len(AO_PQRS_KEY) :]
+
+        finished = False
+        while not finished:
+            end = _END_OF_BLOCK.search(buffer)
+            if end is not None:
+                region, buffer = buffer[: end.start()], ""
+                finished = True
+            else:
+                # only complete rows are parsed, the last (possibly incomplete)
+                # one is kept for the next chunk
+                cut = max(buffer.rfind("["), 0)
+                region, buffer = buffer[:cut], buffer[cut:]
+
+            text = region.translate(_SEPARATORS)
+            rows = np.fromstring(text, sep=" ") if text.strip() else np.empty(0)
+            if rows.size % 5:
+                raise ValueError(f"Malformed {AO_PQRS_KEY} row in {inpfile}.")
+            rows = rows.reshape(-1, 5)
+            if exchange_only:
+                rows = rows[exchange_mask(rows)]
+
+            if nrows + rows.shape[0] > values.shape[0]:
+                capacity = max(2 * values.shape[0], nrows + rows.shape[0])
+                indices = np.concatenate(
+                    (indices[:nrows], np.empty((capacity - nrows, 4), dtype=np.int32))
+                )
+                values = np.concatenate((values[:nrows], np.empty(capacity - nrows)))
+            indices[nrows : nrows + rows.shape[0]] = rows[:, :4]
+            values[nrows : nrows + rows.shape[0]] = rows[:, 4]
+            nrows += rows.shape[0]
+
+            if not finished:
+                chunk = json_file.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"Unterminated {AO_PQRS_KEY} block in {inpfile}.")
+                buffer += chunk
     json_file.close()
 
+    return indices[:nrows], values[:nrows]
+
+
+def is_newer(outfile: Path, inpfile: Path) -> bool:
+    """
+    Check whether `outfile` exists and is at least as new as `inpfile`.
+    """
+    return outfile.is_file() and outfile.stat().st_mtime >= inpfile.stat().st_mtime
+
+
+def sidecar_paths(inpfile: Path) -> tuple[Path, Path]:
+    """
+    Binary sidecar files (AO indices, integral values) belonging to a JSON file.
+    """
+    return (
+        inpfile.parent / (inpfile.stem + ".pqrs.npy"),
+        inpfile.parent / (inpfile.stem + ".values.npy"),
+    )
+
+
+def _save_npy_atomic(outfile: Path, array: np.ndarray) -> None:
+    """
+    Write a .npy file via a temporary file so that readers never see
+    a partially written file.
+    """
+    fd, tmpname = tempfile.mkstemp(dir=outfile.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmpname, outfile)
+    except BaseException:
+        Path(tmpname).unlink(missing_ok=True)
+        raise
+
+
+def load_ao_pqrs(inpfile: Path, sidecar: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the AO indices and values of the 2-el integrals of a JSON file
+    (see read_ao_pqrs).
+    If `sidecar` is True, the parsed arrays are stored in binary sidecar files
+    next to the JSON file on the first read. Later reads memory-map the sidecar
+    files as long as they are newer than the JSON file.
+    """
+    pqrsfile, valuesfile = sidecar_paths(inpfile)
+    if sidecar and is_newer(pqrsfile, inpfile) and is_newer(valuesfile, inpfile):
+        try:
+            indices = np.load(pqrsfile, mmap_mode="r")
+            values = np.load(valuesfile, mmap_mode="r")
+            if indices.shape == (values.shape[0], 4):
+                return indices, values
+        except (OSError, ValueError):
+            pass
+        print(f"Ignoring invalid sidecar files of {inpfile}.")
+
+    indices, values = read_ao_pqrs(inpfile)
+    if sidecar:
+        _save_npy_atomic(valuesfile, values)
+        _save_npy_atomic(pqrsfile, indices)
+    return indices, values
+
+
+def read_exchange_block(inpfile: Path, nao: int = NAO_MAX) -> np.ndarray:
+    """
+    Read only the exchange integrals K[j, i] = (ji|ji) from the JSON file
+    into a dense (nao, nao) matrix (see exchange_block).
+    All other 2-el integrals are dropped while reading.
+    If valid binary sidecar files exist (see load_ao_pqrs), they are used instead.
+
+    NOTE: The matrix is symmetrized, i.e. K[i, j] = K[j, i] even if only one of the
+    symmetry-equivalent index orders is present in the file.
+    """
+    pqrsfile, valuesfile = sidecar_paths(inpfile)
+    if is_newer(pqrsfile, inpfile) and is_newer(valuesfile, inpfile):
+        indices, values = load_ao_pqrs(inpfile)
+        mask = exchange_mask(indices)
+        indices, values = indices[mask], values[mask]
+    else:
+        indices, values = read_ao_pqrs(inpfile, exchange_only=True)
+    kmat = np.zeros((nao, nao))
+    kmat[indices[:, 0], indices[:, 1]] = values
+    kmat[indices[:, 1], indices[:, 0]] = values
+    return kmat
+
+
+def format_integral_rows(indices: np.ndarray, values: np.ndarray) -> str:
+    """
+    Format the 2-el integral rows for verbose output in a single string.
+    """
+    fmt = "<p>: %i, <q>: %i, <r>: %i, <s>: %i, integral: %.6f"
+    rows = np.column_stack((indices, values)).tolist()
+    return "\n".join(fmt % tuple(row) for row in rows)
+
+
+def scatter_integrals(indices: np.ndarray, values: np.ndarray, nao: int) -> np.ndarray:
+    """
+    Scatter the 2-el integral rows into a four-dimensional numpy array.
+
+    Args:
+        indices (np.ndarray): AO indices p, q, r, s with shape (n, 4).
+        values (np.ndarray): Integral values with shape (n,).
+        nao (int): Number of AOs (extent of each dimension of the array).
+
+    Returns:
+        np.ndarray: Array of shape (nao, nao, nao, nao) with
+                    twoelints[p, q, r, s] = value.
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    twoelints = np.zeros((nao, nao, nao, nao))
+    twoelints[indices[:, 0], indices[:, 1], indices[:, 2], indices[:, 3]] = values
+    return twoelints
+
+
+def _dump_integrals(
+    outfile: Path,
+    inpfile: Path,
+    indices: np.ndarray,
+    values: np.ndarray,
+    header: str,
+    dump_format: str,
+    writer: DumpWriter | None,
+) -> None:
+    """
+    Write a dump of the 2-el integrals (in the background if a writer is given).
+    The dump is only rewritten if the JSON file changed.
+    """
+    if dump_format == "none" or is_newer(outfile, inpfile):
+        return
+    if writer is not None:
+        writer.submit(outfile, indices, values, header, dump_format)
+    else:
+        write_dump(outfile, indices, values, header, dump_format)
+
+
+def jsonhandler_resorting_legacy(
+    inpfile: Path,
+    outprefix: str,
+    verb: bool,
+    packed: bool = False,
+    dump_format: str = "text",
+    writer: DumpWriter | None = None,
+) -> np.ndarray | PackedIntegrals:
+    """
+    Read in the JSON file and write the integrals into a numpy array and a file.
+    Indices are swapped to match the order of the integrals in the GP3 method.
+    If `packed` is True, the integrals are returned as PackedIntegrals instead
+    of a dense array.
+    The dumps of the integrals are written in `dump_format` ("text", "binary"
+    or "none"), in the background if a DumpWriter is given.
+    """
     # Create numpy arrays for the data
     print("Creating numpy arrays...")
 
-    # Get the 2elIntegrals list from the data
-    integrals_list = data["Molecule"]["2elIntegrals"]["AO_PQRS"][0]
-
-    integrals_array = np.array(integrals_list)
-    # Swap the indices
-    # exchange each occurence of the integer "3" with "11"
-    integrals_swapped = integrals_array
-    # reordering for p functions
-    integrals_swapped = np.where(integrals_swapped == 1, 13, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 2, 11, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 3, 12, integrals_swapped)
-    # reordering for d functions
-    integrals_swapped = np.where(integrals_swapped == 4, 15, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 5, 17, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 6, 18, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 7, 14, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 8, 16, integrals_swapped)
-    # exchange back
-    integrals_swapped = np.where(integrals_swapped == 11, 1, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 12, 2, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 13, 3, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 14, 4, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 15, 5, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 16, 6, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 17, 7, integrals_swapped)
-    integrals_swapped = np.where(integrals_swapped == 18, 8, integrals_swapped)
+    # Stream the 2elIntegrals rows from the JSON file (or its binary sidecar)
+    indices, values = load_ao_pqrs(inpfile)
+    # Swap the indices from the ORCA to the GP3 order.
+    # Only the index columns are mapped (single lookup-table gather).
+    indices_gp3 = permute_indices(indices, ao_permutation("orca", "gp3", 9))
 
     if verb:
         print("Swapped indices:")
-        print(integrals_swapped)
+        print(np.column_stack((indices_gp3, values)))
         print("Original indices:")
-        print(integrals_array)
+        print(np.column_stack((indices, values)))
 
-    outfile_orcaorder = inpfile.parent / (outprefix + "_integrals_ORCAorder.dat")
-    outfile_gp3order = inpfile.parent / (outprefix + "_integrals_GP3order.dat")
+    outfile_orcaorder = dump_file(
+        inpfile.parent / (outprefix + "_integrals_ORCAorder"), dump_format
+    )
+    outfile_gp3order = dump_file(
+        inpfile.parent / (outprefix + "_integrals_GP3order"), dump_format
+    )
 
     # convert the 2-dimensional numpy array into a 4-dimensional
     # numpy array with the first four fields as indices
-    twoelints = np.zeros((9, 9, 9, 9))
-    for row in integrals_swapped:
-        twoelints[int(row[0]), int(row[1]), int(row[2]), int(row[3])] = row[4]
+    twoelints: np.ndarray | PackedIntegrals
+    if packed:
+        twoelints = PackedIntegrals.from_rows(indices_gp3, values, 9)
+    else:
+        twoelints = scatter_integrals(indices_gp3, values, 9)
     # Write both numpy arrays in a file (within the array format)
     # but write the first four columns as integers and the last one as float
     print("Writing numpy arrays to file...")
     # Introduce a header line with the indices "p q r s" and "integral"
-    np.savetxt(
+    _dump_integrals(
         outfile_orcaorder,
-        integrals_array,
-        fmt="%3i %3i %3i %3i %8.5f",
-        header="Array of 2-el integrals.\n\
+        inpfile,
+        indices,
+        values,
+        "Array of 2-el integrals.\n\
 0 -> s, 1 -> pz, 2 -> px, 3 -> py\np   q   r   s  <integral value>",
+        dump_format,
+        writer,
     )
-    np.savetxt(
+    _dump_integrals(
         outfile_gp3order,
-        integrals_swapped,
-        fmt="%3i %3i %3i %3i %8.5f",
-        header="Array of 2-el integrals.\n\
+        inpfile,
+        indices_gp3,
+        values,
+        "Array of 2-el integrals.\n\
 0 -> s, 1 -> px, 2 -> py, 3 -> pz\np   q   r   s  <integral value>",
+        dump_format,
+        writer,
     )
     return twoelints
 
 
-def jsonhandler_no_resorting(inpfile: Path, outprefix: str, verb: bool):
+def jsonhandler_no_resorting(
+    inpfile: Path,
+    outprefix: str,
+    verb: bool,
+    packed: bool = False,
+    dump_format: str = "text",
+    writer: DumpWriter | None = None,
+) -> np.ndarray | PackedIntegrals:
     """
     Read in the JSON file and write the integrals into a numpy array and a file.
+    If `packed` is True, only the symmetry-unique non-zero integrals are stored
+    (PackedIntegrals) instead of a dense (29, 29, 29, 29) array.
+    The dump of the integrals is written in `dump_format` ("text", "binary"
+    or "none"), in the background if a DumpWriter is given.
     """
-    # Open the JSON file
-    with open(inpfile, encoding="utf8") as json_file:
-        data = json.load(json_file)
-    json_file.close()
-
     # Create numpy arrays for the data
     print("Creating numpy arrays...")
 
-    # Get the 2elIntegrals list from the data
-    # integrals_list: list of 2-el integral data (rows with 5 elements, 4 indices and 1 value)
-    integrals_list = data["Molecule"]["2elIntegrals"]["AO_PQRS"][0]
-    # integrals_array: two-dimensional numpy array of 2-el integrals data
-    integrals_array = np.array(integrals_list)
+    # Stream the 2elIntegrals rows from the JSON file (or its binary sidecar)
+    # indices: AO indices p, q, r, s of each 2-el integral
+    # values: the corresponding integral values
+    indices, values = load_ao_pqrs(inpfile)
     # outfile_orcaorder: output file name for the 2-el integrals in ORCA order
-    outfile_orcaorder = inpfile.parent / (outprefix + "_integrals_ORCAorder.dat")
+    outfile_orcaorder = dump_file(
+        inpfile.parent / (outprefix + "_integrals_ORCAorder"), dump_format
+    )
     # twoelints: four-dimensional numpy array of 2-el integrals data
     #            all indices are in the range 0-15 for the 16 basis functions
     #            s: 0
     #            pz: 1, px: 2, py: 3
     #            dz2: 4, dxz: 5, dyz: 6, dx2-y2: 7, dxy: 8
     #            fz3: 9, fxz2: 10, fyz2: 11, fzx2-y2: 12, fxyz: 13, fx(x2-3y2): 14, fy(3x2-y2): 15
-    np.savetxt(
+    _dump_integrals(
         outfile_orcaorder,
-        integrals_array,
-        fmt="%3i %3i %3i %3i %8.5f",
-        header="Array of 2-el integrals.\n\
+        inpfile,
+        indices,
+        values,
+        "Array of 2-el integrals.\n\
 0 -> s, 1 -> pz, 2 -> px, 3 -> py\n4 -> dz2, 5 -> dxz, 6 -> dyz, 7 -> dx2-y2, 8 -> dxy\n\
 9 -> fz3, 10 -> fxz2, 11 -> fyz2, 12 -> fzx2-y2, 13 -> fxyz, 14 -> fx(x2-3y2), 15 -> fy(3x2-y2)\n\
 p   q   r   s  <integral value>",
+        dump_format,
+        writer,
     )
-    twoelints = np.zeros((29, 29, 29, 29))
-    for row in integrals_array:
-        if verb:
-            print(
-                f"<p>: {int(row[0])}, <q>: {int(row[1])}, <r>: {int(row[2])}, <s>: {int(row[3])}, integral: {row[4]:.6f}"
-            )
-        twoelints[int(row[0]), int(row[1]), int(row[2]), int(row[3])] = row[4]
+    if verb:
+        print(format_integral_rows(indices, values))
+    if packed:
+        return PackedIntegrals.from_rows(indices, values, NAO_MAX)
+    twoelints = scatter_integrals(indices, values, NAO_MAX)
     return twoelints
 
 
-def modtwoelints_analytic_average_legacy(twoelints: np.ndarray, ati: int, verb: bool):
+def modtwoelints_analytic_average_legacy(
+    twoelints: np.ndarray | PackedIntegrals, ati: int, verb: bool
+):
     """
     Modify the two-electron integrals to match the MSINDO-XC method.
     """
@@ -200,8 +444,142 @@ def modtwoelints_analytic_average_legacy(twoelints: np.ndarray, ati: int, verb:
     return msindo_xc_ints
 
 
+# Shell pairs for which the exchange integrals are averaged.
+# The position in this table is the row in the onecxcints array.
+# Pairs of the same shell (p-p', ...) combine different AOs of that shell.
+SHELL_PAIRS: tuple[tuple[str, str, str], ...] = (
+    ("s-p", "s", "p"),
+    ("p-p'", "p", "p"),
+    ("s-d", "s", "d"),
+    ("p-d", "p", "d"),
+    ("d-d'", "d", "d"),
+    ("s-f", "s", "f"),
+    ("p-f", "p", "f"),
+    ("d-f", "d", "f"),
+    ("f-f'", "f", "f"),
+)
+
+
+def valence_layout(ati: int) -> str:
+    """
+    Name of the AO layout of the element (see VALENCE_RANGES).
+    """
+    if 57 < ati < 72 or ati > 88:
+        return "lnac"
+    if 86 < ati < 89:
+        return "frra"
+    return "general"
+
+
+# AO ranges of the valence shells for the different AO layouts.
+# f shells are only taken into account for the Ln's/Ac's.
+VALENCE_RANGES: dict[str, dict[str, range]] = {
+    "general": {"s": range(0, 1), "p": range(1, 4), "d": range(4, 9)},
+    "lnac": {
+        "s": range(2, 3),
+        "p": range(9, 12),
+        "d": range(17, 22),
+        "f": range(22, 29),
+    },
+    "frra": {"s": range(1, 2), "p": range(5, 8), "d": range(8, 13)},
+}
+
+
+def _shell_pair_indices(layout: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    AO indices (i, j) of all exchange integrals ints[j, i, j, i] that enter
+    the shell-pair averages, together with the row in SHELL_PAIRS they belong to.
+    """
+    ranges = VALENCE_RANGES[layout]
+    i_list: list[int] = []
+    j_list: list[int] = []
+    pair_list: list[int] = []
+    for ipair, (_, bra, ket) in enumerate(SHELL_PAIRS):
+        if bra not in ranges or ket not in ranges:
+            continue
+        if bra == ket:
+            # NOTE: identical to the former loops
+            # "for i in range[:-1]: for j in range(i + 1, range[-1])",
+            # i.e., the last AO of the shell does not enter the average.
+            pairs = [
+                (i, j) for i in ranges[bra][:-1] for j in range(i + 1, ranges[bra][-1])
+            ]
+        else:
+            pairs = [(i, j) for i in ranges[bra] for j in ranges[ket]]
+        i_list.extend(i for i, _ in pairs)
+        j_list.extend(j for _, j in pairs)
+        pair_list.extend(ipair for _ in pairs)
+    return np.array(i_list), np.array(j_list), np.array(pair_list)
+
+
+SHELL_PAIR_INDICES: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {
+    layout: _shell_pair_indices(layout) for layout in VALENCE_RANGES
+}
+
+
+def exchange_block(
+    ints: np.ndarray | PackedIntegrals, nao: int = NAO_MAX
+) -> np.ndarray:
+    """
+    Extract the exchange integrals K[j, i] = ints[j, i, j, i] of an element.
+
+    NOTE: As in read_exchange_block, the matrix is symmetrized. A dense array
+    scattered from the JSON rows only holds the index orders present in the file,
+    so all symmetry-equivalent orders (ji|ji), (ij|ij), (ji|ij) and (ij|ji) are
+    looked up and the non-zero one is taken.
+    The shell averages read K[j, i] with j > i. For files that hold this triangle
+    ((ji|ji) with j > i, as written by orca_2json), they are identical to the
+    former averaging of ints[j, i, j, i]. For files that hold only the other
+    orders, the former averaging counted these integrals as zero, now their
+    values enter the averages.
+
+    Args:
+        ints (np.ndarray | PackedIntegrals): Four-index 2-el integrals.
+        nao (int): Dimension of the returned matrix. AOs that are not present
+                   in `ints` are zero.
+
+    Returns:
+        np.ndarray: Symmetric exchange matrix with shape (nao, nao).
+    """
+    n = min(nao, ints.shape[0])
+    j, i = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    candidates = np.stack(
+        [ints[j, i, j, i], ints[i, j, i, j], ints[j, i, i, j], ints[i, j, j, i]]
+    )
+    choice = np.abs(candidates).argmax(axis=0)
+    kmat = np.zeros((nao, nao))
+    kmat[:n, :n] = np.take_along_axis(candidates, choice[None], axis=0)[0]
+    return kmat
+
+
+def shell_pair_statistics(
+    kmat: np.ndarray, ati: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Average the exchange integrals of all shell pairs in SHELL_PAIRS in one pass.
+
+    Args:
+        kmat (np.ndarray): Exchange matrix K[j, i] = ints[j, i, j, i]
+                           (see exchange_block).
+        ati (int): Atomic number of the element.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Average integral, number of
+            contributing (non-zero) and number of zero integrals per shell pair.
+            Shell pairs that do not exist for the element are zero.
+    """
+    i, j, pair = SHELL_PAIR_INDICES[valence_layout(ati)]
+    values = kmat[j, i]
+    npairs = len(SHELL_PAIRS)
+    counts = np.bincount(pair, minlength=npairs)
+    contributing = np.bincount(pair, values > ZERO_THRESHOLD, minlength=npairs)
+    sums = np.bincount(pair, values, minlength=npairs)
+    averages = np.divide(sums, counts, out=np.zeros(npairs), where=counts > 0)
+    return averages, contributing.astype(int), counts - contributing.astype(int)
+
+
 def average_shell_exchange_integrals(
-    ints: np.ndarray, ati: int, verb: bool
+    ints: np.ndarray | PackedIntegrals, ati: int, verb: bool
 ) -> np.ndarray:
     """
     Modify the two-electron integrals to match the MSINDO-XC method.
@@ -232,245 +610,82 @@ def average_shell_exchange_integrals(
     D -> 13
     F -> 20
     """
-    s_valence_range = [0]
-    if 57 < ati < 72 or ati > 88:
-        s_valence_range = [2]
-    elif 86 < ati < 89:
-        s_valence_range = [1]
-    p_valence_range = range(1, 4)
-    if 57 < ati < 72 or ati > 88:
-        p_valence_range = range(9, 12)
-    elif 86 < ati < 89:
-        p_valence_range = range(5, 8)
-    d_valence_range = range(4, 9)
-    if 57 < ati < 72 or ati > 88:
-        d_valence_range = range(17, 22)
-    elif 86 < ati < 89:
-        d_valence_range = range(8, 13)
-    # NOTE: Only conducted for Ln's/Ac's!
-    f_valence_range = range(22, 29)
+    return average_exchange_block(exchange_block(ints), ati, verb)
+
+
+def average_exchange_block(kmat: np.ndarray, ati: int, verb: bool) -> np.ndarray:
+    """
+    Average the exchange integrals K[j, i] = ints[j, i, j, i] of an element
+    for all shell pairs in SHELL_PAIRS (see average_shell_exchange_integrals).
+    """
     print("Modifying two-electron integrals...")
-    msindo_xc_ints = np.zeros((9))
-    #################
-    # s-p integrals:
-    #################
-    print("s-p integrals:")
-    counter: int = 0
-    sum_s_p: float = 0.0
-    effective_counter: int = 0
-    zero_integrals: int = 0
-    for i in s_valence_range:
-        for j in p_valence_range:
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_s_p += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_s_p = sum_s_p / counter
-    print(f"Average s-p integral: {average_s_p:.6f}")
-    print(f"# contributing s-p integrals: {effective_counter}")
-    msindo_xc_ints[0] = average_s_p
-    #################
-    # p-p' integrals:
-    #################
-    print("p-p' integrals:")
-    counter = 0
-    sum_p_p: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in p_valence_range[:-1]:
-        for j in range(i + 1, p_valence_range[-1]):
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_p_p += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_p_p = sum_p_p / counter
-    print(f"Average p-p' integral: {average_p_p:.6f}")
-    print(f"# contributing p-p' integrals: {effective_counter}")
-    msindo_xc_ints[1] = average_p_p
-    #################
-    # s-d integrals:
-    #################
-    print("s-d integrals:")
-    counter = 0
-    sum_s_d: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in s_valence_range:
-        for j in d_valence_range:
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_s_d += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_s_d = sum_s_d / counter
-    print(f"Average s-d integral: {average_s_d:.6f}")
-    print(f"# contributing s-d integrals: {effective_counter}")
-    msindo_xc_ints[2] = average_s_d
-    #################
-    # p-d integrals:
-    #################
-    print("p-d integrals:")
-    counter = 0
-    sum_p_d: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in p_valence_range:
-        for j in d_valence_range:
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_p_d += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_p_d = sum_p_d / counter
-    print(f"Average p-d integral: {average_p_d:.6f}")
-    print(f"# contributing p-d integrals: {effective_counter}")
-    msindo_xc_ints[3] = average_p_d
-    #################
-    # d-d' integrals:
-    #################
-    print("d-d' integrals:")
-    counter = 0
-    sum_d_d: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in d_valence_range[:-1]:
-        for j in range(i + 1, d_valence_range[-1]):
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_d_d += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_d_d = sum_d_d / counter
-    print(f"Average d-d' integral: {average_d_d:.6f}")
-    print(f"# contributing d-d' integrals: {effective_counter}")
-    msindo_xc_ints[4] = average_d_d
-    if not (57 < ati < 72 or ati > 88):
-        return msindo_xc_ints
-    #################
-    # s-f integrals:
-    #################
-    print("s-f integrals:")
-    counter = 0
-    sum_s_f: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in s_valence_range:
-        for j in f_valence_range:
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_s_f += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_s_f = sum_s_f / counter
-    print(f"Average s-f integral: {average_s_f:.6f}")
-    print(f"# contributing s-f integrals: {effective_counter}")
-    msindo_xc_ints[5] = average_s_f
-    #################
-    # p-f integrals:
-    #################
-    print("p-f integrals:")
-    counter = 0
-    sum_p_f: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in p_valence_range:
-        for j in f_valence_range:
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_p_f += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_p_f = sum_p_f / counter
-    print(f"Average p-f integral: {average_p_f:.6f}")
-    print(f"# contributing p-f integrals: {effective_counter}")
-    msindo_xc_ints[6] = average_p_f
-    #################
-    # d-f integrals:
-    #################
-    print("d-f integrals:")
-    counter = 0
-    sum_d_f: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in d_valence_range:
-        for j in f_valence_range:
-            if verb:
-                print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
-                )
-            counter += 1
-            sum_d_f += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_d_f = sum_d_f / counter
-    print(f"Average d-f integral: {average_d_f:.6f}")
-    print(f"# contributing d-f integrals: {effective_counter}")
-    msindo_xc_ints[7] = average_d_f
-    #################
-    # f-f integrals:
-    #################
-    print("f-f integrals:")
-    counter = 0
-    sum_f_f: float = 0.0
-    effective_counter = 0
-    zero_integrals = 0
-    for i in f_valence_range[:-1]:
-        for j in range(i + 1, f_valence_range[-1]):
-            if verb:
+    msindo_xc_ints, contributing, _ = shell_pair_statistics(kmat, ati)
+    i, j, pair = SHELL_PAIR_INDICES[valence_layout(ati)]
+    for ipair in np.unique(pair):
+        label = SHELL_PAIRS[ipair][0]
+        print(f"{label} integrals:")
+        if verb:
+            for ii, jj in zip(i[pair == ipair], j[pair == ipair]):
                 print(
-                    f"<p>: {j}, <q>: {i}, <r>: {j}, <s>: {i}, integral: {ints[j, i, j, i]:.6f}"
+                    f"<p>: {jj}, <q>: {ii}, <r>: {jj}, <s>: {ii}, integral: {kmat[jj, ii]:.6f}"
                 )
-            counter += 1
-            sum_f_f += ints[j, i, j, i]
-            if ints[j, i, j, i] > 1e-7:
-                effective_counter += 1
-            else:
-                zero_integrals += 1
-    average_f_f = sum_f_f / counter
-    print(f"Average f-f integral: {average_f_f:.6f}")
-    print(f"# contributing f-f integrals: {effective_counter}")
-    msindo_xc_ints[8] = average_f_f
+        print(f"Average {label} integral: {msindo_xc_ints[ipair]:.6f}")
+        print(f"# contributing {label} integrals: {contributing[ipair]}")
 
     #################
     # RETURN AVERAGE INTEGRALS PER ATOM
     #################
     return msindo_xc_ints
+
+
+# order of the AO layouts in SHELL_PAIR_MASKS
+LAYOUTS: tuple[str, ...] = tuple(VALENCE_RANGES)
+
+
+def _shell_pair_masks() -> np.ndarray:
+    """
+    Masks of the exchange integrals K[j, i] that enter each shell-pair average
+    with shape (layout, shell pair, NAO_MAX, NAO_MAX).
+    """
+    masks = np.zeros((len(LAYOUTS), len(SHELL_PAIRS), NAO_MAX, NAO_MAX), dtype=bool)
+    for ilayout, layout in enumerate(LAYOUTS):
+        i, j, pair = SHELL_PAIR_INDICES[layout]
+        masks[ilayout, pair, j, i] = True
+    return masks
+
+
+SHELL_PAIR_MASKS = _shell_pair_masks()
+
+
+def average_shell_exchange_integrals_batched(
+    kblocks: np.ndarray, atomic_numbers: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Average the exchange integrals of many elements in a single vectorized pass.
+
+    Args:
+        kblocks (np.ndarray): Stacked exchange matrices K[j, i] = ints[j, i, j, i]
+                              (see exchange_block) with shape (nelem, NAO_MAX, NAO_MAX).
+        atomic_numbers (np.ndarray | None): Atomic number of each block.
+                              If None, block k belongs to atomic number k,
+                              i.e. kblocks has the layout of the onecxcints array.
+
+    Returns:
+        np.ndarray: Shell-pair averages with shape (len(SHELL_PAIRS), nelem),
+                    e.g. the (9, 104) onecxcints array.
+    """
+    if atomic_numbers is None:
+        atomic_numbers = np.arange(kblocks.shape[0])
+    layout_ids = np.array(
+        [LAYOUTS.index(valence_layout(int(ati))) for ati in atomic_numbers],
+        dtype=int,
+    )
+    weights = SHELL_PAIR_MASKS / np.maximum(
+        SHELL_PAIR_MASKS.sum(axis=(2, 3), keepdims=True), 1
+    )
+    # averages for all layouts, then pick the layout of each element
+    averages = np.einsum("eji,lpji->elp", kblocks, weights)
+    averages = averages[np.arange(kblocks.shape[0]), layout_ids]
+    # the dummy element 0 is not averaged
+    averages[np.asarray(atomic_numbers) == 0] = 0.0
+    return averages.T
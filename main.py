@@ -7,35 +7,92 @@ and writes them into a file in the format required by GP3.
 """
 
 # Python script for reading in an JSON file and inserting numbers into numpy arrays
+import os
 import shutil
 from pathlib import Path
 import sys
 import argparse
-import subprocess as sp
+import contextlib
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Any
 import numpy as np
 from inthandler import (
     jsonhandler_resorting_legacy,
     jsonhandler_no_resorting,
     modtwoelints_analytic_average_legacy,
-    average_shell_exchange_integrals,
+    average_exchange_block,
+    average_shell_exchange_integrals_batched,
+    exchange_block,
+    NAO_MAX,
+    read_exchange_block,
+    sidecar_paths,
 )
-from plot import plot_onexc_ints
-from fortranarray import write_fortran_array, write_fortran_data
-from strucio import xyzwriter
+from fortranarray import write_fortran_array, write_fortran_binary, write_fortran_data
 from q_cn_import import read_q_cn
-
-QVSZP_PATH = "qvSZP"
-qvszp_binary = shutil.which(QVSZP_PATH)
-if qvszp_binary is None:
-    raise ImportError(f"Could not find {QVSZP_PATH} in $PATH.")
-print("Binary used:")
-print(qvszp_binary)
-ORCA_PATH = "orca"
-orca_binary = shutil.which(ORCA_PATH)
-if orca_binary is None:
-    raise ImportError(f"Could not find {ORCA_PATH} in $PATH.")
-print("Binary used:")
-print(orca_binary)
+from calculation import (
+    BASIS_FILE,
+    CONF_FILE,
+    ECP_FILE,
+    CalculationError,
+    charge_model,
+    find_binaries,
+    find_guess,
+    json_complete,
+    load_result,
+    prepare_element,
+    qvszp_command,
+    run_calculation,
+    save_result,
+    scratch_directory,
+    stage_in,
+    stage_out,
+)
+from resultcache import ResultCache, cache_key
+from costmodel import (
+    RUNTIME_HISTORY_FILE,
+    CoreBudget,
+    assign_ranks,
+    balance_shards,
+    estimate_costs,
+    load_history,
+    longest_first,
+    update_history,
+)
+from slatercondon import (
+    FIT_TOLERANCE,
+    PARAMETERS,
+    SLATER_CONDON_FILE,
+    exchange_blocks_from_parameters,
+    fit_slater_condon,
+)
+from analyticints import (
+    ANALYTIC_TOLERANCE,
+    analytic_exchange_block,
+    compare_with_json,
+    read_basis,
+)
+from dumpwriter import DUMP_FORMATS, DumpWriter
+from instrument import TIMINGS_PREFIX, Timings
+from scan import (
+    SCAN_TABLE,
+    guess_candidates,
+    interpolate,
+    load_table,
+    open_table,
+    parse_grid,
+    run_point,
+    run_scan,
+)
+from batch import (
+    BATCH_BACKENDS,
+    BATCH_OPTIONS,
+    LocalArrayBackend,
+    SlurmArrayBackend,
+    shard_elements,
+    strip_options,
+)
 
 PSE: dict[int, str] = {
     0: "X",
@@ -158,199 +215,1109 @@ PSE: dict[int, str] = {
     117: "Ts",
     118: "Og",
 }
+# elements for which the calculation or the analysis failed
+FAILURES_FILE = "failed_elements.json"
+# stacked exchange integrals K[j, i] = ints[j, i, j, i] of all elements
+EXCHANGE_BLOCKS_FILE = "exchange_blocks.npy"
+# grid points for which the calculation failed in the scan mode
+SCAN_FAILURES_FILE = "scan_failures.json"
+
 PSE_NUMBERS: dict[str, int] = {k.lower(): v for v, k in PSE.items()}
 PSE_SYMBOLS: dict[int, str] = {v: k.lower() for v, k in PSE.items()}
 
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description="Run qvSZP for all elements in pesdict.")
-parser.add_argument(
-    "-v",
-    "--verbose",
-    action="store_true",
-    default=False,
-    help="increase output verbosity",
-)
-parser.add_argument(
-    "-ext", "--external_charges", action="store_true", help="use external charges"
-)
-parser.add_argument(
-    "-dry", "--dry_run", action="store_true", help="only perform first input generation"
-)
-parser.add_argument(
-    "--legacy",
-    action="store_true",
-    default=False,
-    help="use the legacy version of ORCA_2JSON",
-)
-parser.add_argument(
-    "--read-only",
-    "-r",
-    action="store_true",
-    default=False,
-    help="Do not perform calculations. Just read in the JSON files.",
-)
-parser.add_argument(
-    "--specific_element",
-    "-se",
-    type=str,
-    default=None,
-    help="Only run for a specific element",
-)
-args = parser.parse_args()
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Command line arguments of main.py.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run qvSZP for all elements in pesdict."
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        default=False,
+        help="increase output verbosity",
+    )
+    parser.add_argument(
+        "-ext", "--external_charges", action="store_true", help="use external charges"
+    )
+    parser.add_argument(
+        "-dry",
+        "--dry_run",
+        action="store_true",
+        help="only perform first input generation",
+    )
+    parser.add_argument(
+        "--legacy",
+        action="store_true",
+        default=False,
+        help="use the legacy version of ORCA_2JSON",
+    )
+    parser.add_argument(
+        "--read-only",
+        "-r",
+        action="store_true",
+        default=False,
+        help="Do not perform calculations. Just read in the JSON files.",
+    )
+    parser.add_argument(
+        "--specific_element",
+        "-se",
+        type=str,
+        default=None,
+        help="Only run for a specific element",
+    )
+    parser.add_argument(
+        "--mpi",
+        type=int,
+        default=4,
+        help="Number of MPI ranks used by qvSZP/ORCA for each element (default: 4)",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=("order", "cost"),
+        default="order",
+        help="'order': run the elements in the order of the atomic numbers with "
+        + "--mpi ranks each. 'cost': start the most expensive elements first "
+        + "(estimated from --history or the number of AOs) and give each element "
+        + "up to --mpi ranks according to its cost, with at most --cores cores "
+        + "in use (default: jobs * mpi). With --batch, the shards are balanced "
+        + "by cost.",
+    )
+    parser.add_argument(
+        "--history",
+        type=str,
+        default=RUNTIME_HISTORY_FILE,
+        help="Runtimes of previous sweeps used by --schedule cost. Updated after "
+        + f"each sweep (default: {RUNTIME_HISTORY_FILE})",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="Number of elements that are processed concurrently",
+    )
+    parser.add_argument(
+        "--cores",
+        type=int,
+        default=None,
+        help="Total number of cores available. Limits the number of concurrent "
+        + "jobs to cores // mpi.",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        default=False,
+        help="Run the elements in an asyncio pipeline in which parsing and "
+        + "averaging of finished elements overlaps with the calculations of the "
+        + "next ones. The concurrency of each stage can be limited separately.",
+    )
+    for option, stage in (
+        ("qvszp", "qvSZP runs"),
+        ("orca", "ORCA runs"),
+        ("json", "orca_2json runs"),
+        ("analysis", "analyses (parsing and averaging)"),
+    ):
+        parser.add_argument(
+            f"--{option}-jobs",
+            type=int,
+            default=None,
+            help=f"Maximum number of concurrent {stage} with --async "
+            + "(default: --jobs)",
+        )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=4,
+        help="Number of calculated elements that may wait for the analysis "
+        + "with --async (default: 4)",
+    )
+    parser.add_argument(
+        "--scratch",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="DIR",
+        help="Run qvSZP/ORCA/orca_2json of each element in a node-local scratch "
+        + "directory below DIR (default: $TMPDIR) and only copy the input, JSON "
+        + "and output files back to the element directory.",
+    )
+    parser.add_argument(
+        "--keep-gbw",
+        action="store_true",
+        default=False,
+        help="Also copy the gbw file back from the scratch directory.",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        default=False,
+        help="Start the SCF of each element from the converged orbitals of the "
+        + "previous calculation of the element with the closest external charge "
+        + "and CN (element directory, scan points and --guess-dir).",
+    )
+    parser.add_argument(
+        "--guess-dir",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="Working directory of a previous run whose calculations are used "
+        + "as initial guesses (can be given multiple times, implies --warm-start)",
+    )
+    parser.add_argument(
+        "--elements",
+        type=str,
+        default=None,
+        help="Comma-separated list of elements (symbols or atomic numbers) or "
+        + "ranges of atomic numbers to run, e.g. 'h,he,57-71'",
+    )
+    parser.add_argument(
+        "--batch",
+        choices=BATCH_BACKENDS,
+        default=None,
+        help="Run the elements as a job array: 'slurm' writes (and with --submit "
+        + "submits) a SLURM array script and a merge script, 'local' runs the "
+        + "array tasks and the merge step on this machine.",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=None,
+        help="Number of array tasks with --batch (default: one per element)",
+    )
+    parser.add_argument(
+        "--submit",
+        action="store_true",
+        default=False,
+        help="Submit the SLURM scripts with sbatch.",
+    )
+    parser.add_argument(
+        "--sbatch",
+        action="append",
+        default=[],
+        metavar="OPTION",
+        help="Additional #SBATCH option, e.g. --sbatch=--time=02:00:00. "
+        + "Can be given multiple times.",
+    )
+    parser.add_argument(
+        "--shard",
+        action="store_true",
+        default=False,
+        help="Only compute and store the per-element results "
+        + "without assembling onecxcints (used by the array tasks).",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        default=False,
+        help="Collect the per-element results (<element>/result.npz) of a sharded run "
+        + "and write onecxcints.npy and the Fortran files.",
+    )
+    parser.add_argument(
+        "--scan-q",
+        type=str,
+        default=None,
+        metavar="GRID",
+        help="Scan mode: external charges of the grid as 'start:stop:num' or a "
+        + "comma-separated list (requires --scan-cn)",
+    )
+    parser.add_argument(
+        "--scan-cn",
+        type=str,
+        default=None,
+        metavar="GRID",
+        help="Scan mode: CNs of the grid as 'start:stop:num' or a "
+        + "comma-separated list (requires --scan-q)",
+    )
+    parser.add_argument(
+        "--scan-table",
+        type=str,
+        default=SCAN_TABLE,
+        help="Memory-mapped table (element x q x CN x shell pair) of the scan mode "
+        + f"(default: {SCAN_TABLE})",
+    )
+    parser.add_argument(
+        "--interpolate",
+        type=float,
+        nargs=2,
+        default=None,
+        metavar=("Q", "CN"),
+        help="Print the shell averages of the selected elements interpolated "
+        + "from the scan table at the given charge and CN.",
+    )
+    parser.add_argument(
+        "--packed",
+        action="store_true",
+        default=False,
+        help="Store only the symmetry-unique non-zero 2-el integrals instead of a "
+        + "dense 4-index array",
+    )
+    parser.add_argument(
+        "--reaverage",
+        action="store_true",
+        default=False,
+        help="Do not read the JSON files. Re-average the exchange integrals stored in "
+        + f"{EXCHANGE_BLOCKS_FILE} (or regenerated from the Slater-Condon "
+        + f"parameters in {SLATER_CONDON_FILE}) and write the results.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory of a persistent result cache that can be shared between "
+        + "working directories. Elements with identical inputs are not recomputed.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Skip elements that are already completed (valid result or JSON file "
+        + "present) and only run the missing ones.",
+    )
+    parser.add_argument(
+        "--exchange-only",
+        action="store_true",
+        default=False,
+        help="Only read the exchange integrals (ij|ij) from the JSON files "
+        + "instead of all 2-el integrals",
+    )
+    parser.add_argument(
+        "--analytic",
+        action="store_true",
+        default=False,
+        help="Only run qvSZP and compute the exchange integrals analytically from "
+        + "the basis set in hf_q-vSZP.inp instead of running ORCA and orca_2json.",
+    )
+    parser.add_argument(
+        "--analytic-check",
+        action="store_true",
+        default=False,
+        help="Compare the analytic exchange integrals of the selected elements "
+        + "with the ones in their existing JSON files and exit.",
+    )
+    parser.add_argument(
+        "--dump",
+        choices=DUMP_FORMATS,
+        default="text",
+        help="Format of the per-element dumps of the 2-el integrals "
+        + "(<element>_integrals_*.dat/.npz). They are written in a background thread.",
+    )
+    parser.add_argument(
+        "--no-plot",
+        action="store_true",
+        default=False,
+        help="Do not plot the integrals (skips importing the plotting libraries).",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        default=False,
+        help="Render the plot in a background process with the non-interactive "
+        + "Agg backend instead of showing it (e.g. for batch jobs).",
+    )
+    parser.add_argument(
+        "--panels",
+        action="store_true",
+        default=False,
+        help="Plot each shell interaction in a separate panel.",
+    )
+    parser.add_argument(
+        "--compare",
+        action="append",
+        default=[],
+        metavar="NAME=FILE.npy",
+        help="Overlay another onecxcints array (e.g. of a different charge model) "
+        + "in the plot. Can be given multiple times.",
+    )
+    parser.add_argument(
+        "--fortran-binary",
+        action="store_true",
+        default=False,
+        help="Additionally write gmunu as Fortran stream binary file "
+        + "(onecxcints.bin) that g-xTB can read at runtime.",
+    )
+    return parser
 
-if args.external_charges:
-    if args.verbose:
-        print("Using external charges")
-    q_cn_dict = read_q_cn(Path("q_cn.dat").resolve(), args.verbose)
-
-if args.specific_element:
-    if args.specific_element not in PSE_NUMBERS:
-        raise ValueError(f"Element {args.specific_element} not in the periodic table.")
-
-onecxcints = np.zeros((9, 104))
-# if onexcints.npy is a file, load it and plot it
-if Path("onecxcints.npy").is_file():
-    onecxcints = np.load("onecxcints.npy")
-    plot_onexc_ints(onecxcints)
+
+def write_outputs(onecxcints: np.ndarray, args: argparse.Namespace) -> None:
+    """
+    Plot the onecenterxcints array and write it to Fortran code.
+    Fortran files are only rewritten if their content changed.
+    """
+    if not args.no_plot:
+        # pandas, matplotlib and seaborn are only imported if a plot is desired
+        # pylint: disable-next=import-outside-toplevel
+        from plot import plot_onexc_ints, plot_onexc_ints_background
+
+        datasets = {"onecxcints": onecxcints}
+        for entry in args.compare:
+            name, _, npyfile = entry.rpartition("=")
+            datasets[name or Path(npyfile).stem] = np.load(npyfile)
+        if args.headless:
+            plot_onexc_ints_background(datasets, panels=args.panels)
+        else:
+            plot_onexc_ints(datasets, panels=args.panels)
     # write the onecenterxcints array to Fortran code.
-    write_fortran_array(onecxcints, "onecxcints_array.f90")
-    write_fortran_data(onecxcints, "onecxcints_data.f90")
-    if args.read_only:
-        sys.exit(0)
+    outputs = {
+        "onecxcints_array.f90": write_fortran_array,
+        "onecxcints_data.f90": write_fortran_data,
+    }
+    if args.fortran_binary:
+        outputs["onecxcints.bin"] = write_fortran_binary
+    for outfile, writer in outputs.items():
+        if writer(onecxcints, outfile):
+            print(f"Written {outfile}")
+        else:
+            print(f"{outfile} is up to date")
 
-# print current directory via pathlib
-print("Current working directory:", Path.cwd())
-for i in range(1, 104):
-    if args.specific_element:
-        if i != PSE_NUMBERS[args.specific_element]:
-            continue
-    print(f"Running for element {PSE_SYMBOLS[i]}")
+
+def setup_element(
+    ati: int,
+    args: argparse.Namespace,
+    q_cn_dict: dict[str, dict[str, float]],
+    binaries: dict[str, str],
+    cache: ResultCache | None,
+) -> tuple[tuple[np.ndarray, np.ndarray | None] | None, str | None, str | None]:
+    """
+    Check whether the result of an element is already available (resume, cache)
+    and otherwise prepare its calculation.
+
+    Returns:
+        tuple: The result (or None), the cache key (None if the result must not
+               be cached, e.g. the output of a previous run is reused) and the
+               charge model for qvSZP (None if no calculation has to be run).
+    """
+    print(f"Running for element {PSE_SYMBOLS[ati]}")
 
     # check if a directory with the element name exists and if not create it
-    element_path = Path(PSE_SYMBOLS[i]).resolve()
+    element_path = Path(PSE_SYMBOLS[ati]).resolve()
+    if args.resume and not args.dry_run:
+        result = load_result(element_path)
+        # only results of the same mode (legacy or not) are reused
+        if result is not None and (result[1] is None) == args.legacy:
+            print(f"Element {PSE_SYMBOLS[ati]} already completed.")
+            return result, None, None
+
+    q_cn = q_cn_dict[str(ati)] if args.external_charges else None
+    key = None
+    if cache is not None and not args.read_only and not args.dry_run:
+        key = cache_key(
+            ati,
+            q_cn,
+            charge_model(q_cn),
+            {"conf": CONF_FILE, "basis": BASIS_FILE, "ecp": ECP_FILE},
+            {**binaries, "orca_2json": shutil.which("orca_2json")},
+            # all options except for the binary path and the number of MPI ranks
+            qvszp_command("qvSZP", PSE_SYMBOLS[ati] + ".xyz", charge_model(q_cn), 0)
+            + (["--analytic"] if args.analytic else []),
+        )
+        kmat = cache.load(key)
+        if kmat is not None:
+            print(f"Cache hit for element {PSE_SYMBOLS[ati]} ({key[:12]})")
+            msindo_xc_ints = average_exchange_block(kmat, ati, args.verbose)
+            element_path.mkdir(exist_ok=True)
+            save_result(element_path, msindo_xc_ints, kmat)
+            return (msindo_xc_ints, kmat), key, None
     # do the steps in the if clause only if calculating integrals from scratch is desired.
+    if args.analytic:
+        completed = args.resume and (element_path / "hf_q-vSZP.inp").is_file()
+    else:
+        completed = args.resume and json_complete(element_path / "hf_q-vSZP.json")
+    if completed:
+        print(f"Calculation for element {PSE_SYMBOLS[ati]} already completed.")
+        # the existing output may stem from other inputs (charges, binaries),
+        # so it must not be stored under the key of the current ones
+        return None, None, None
     if not args.read_only:
-        element_path.mkdir(exist_ok=True)
-        print(f"Successfully created the directory {element_path}")
+        return None, key, prepare_element(ati, PSE_SYMBOLS[ati], element_path, q_cn)
+    return None, key, None
 
-        # Copy "hf_q-vSZP.json.conf" to current directory
-        shutil.copy("hf_q-vSZP.json.conf", element_path)
 
-        # Write the xyz file with the uppercase element symbols and the lower case file name
-        strucfile = element_path / (PSE_SYMBOLS[i] + ".xyz")
-        if i % 2:
-            with open(element_path / ".UHF", "w", encoding="utf8") as f:
-                f.write("1")
-            f.close()
-        xyzwriter(PSE_SYMBOLS[i].upper(), strucfile)
+def keep_gbw(args: argparse.Namespace) -> bool:
+    """
+    Whether the gbw files are copied back from the scratch directory
+    (always with warm starts, so that they can serve as initial guesses).
+    """
+    return args.keep_gbw or args.warm_start or bool(args.guess_dir)
 
-        # if external charges are used, write the charges to the file "ext.charges"
-        if args.external_charges:
-            with open(element_path / "ext.charges", "w", encoding="utf8") as f:
-                f.write(
-                    str(q_cn_dict[str(i)]["q"]) + " " + str(q_cn_dict[str(i)]["CN"])
-                )
-            f.close()
-            CHARGEMODEL = "ext"
-        else:
-            CHARGEMODEL = "ceh_external"
-
-        try:
-            process = sp.run(
-                [
-                    qvszp_binary,
-                    "--struc",
-                    strucfile.name,
-                    "--bfile",
-                    "/Users/marcelmueller/source/qvSZP/q-vSZP_basis/basisq-3.0.0",
-                    "--efile",
-                    "/Users/marcelmueller/source/qvSZP/q-vSZP_basis/ecpq",
-                    "--mpi",
-                    "4",
-                    "--guess",
-                    "hcore",
-                    "--hfref",
-                    "--scf-cycles",
-                    "1000",
-                    "--cm",
-                    CHARGEMODEL,
-                    "--notrahf",
-                ],
-                cwd=element_path,
-                capture_output=True,
-                text=True,
-                check=True,
+
+def guess_bases(args: argparse.Namespace) -> list[Path] | None:
+    """
+    Working directories searched for initial guesses (None without warm starts).
+    """
+    if not args.warm_start and not args.guess_dir:
+        return None
+    return [Path.cwd()] + [Path(base).resolve() for base in args.guess_dir]
+
+
+def element_guess(
+    ati: int, args: argparse.Namespace, q_cn_dict: dict[str, dict[str, float]]
+) -> Path | None:
+    """
+    gbw file used as initial guess for an element (None without warm starts or
+    if no previous calculation of the element is available).
+    """
+    bases = guess_bases(args)
+    if bases is None:
+        return None
+    q_cn = q_cn_dict[str(ati)] if args.external_charges else None
+    guess = find_guess(q_cn, guess_candidates(PSE_SYMBOLS[ati], bases))
+    if guess is not None:
+        print(f"Warm start of element {PSE_SYMBOLS[ati]} from {guess}")
+    return guess
+
+
+def analyse_element(
+    ati: int,
+    key: str | None,
+    args: argparse.Namespace,
+    cache: ResultCache | None,
+    dump_writer: DumpWriter | None,
+    timings: Timings,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Read the integrals of a calculated element, average them and store the result
+    (and in the cache if `key` is given).
+    """
+    element_path = Path(PSE_SYMBOLS[ati]).resolve()
+    if args.analytic:
+        with timings.stage(PSE_SYMBOLS[ati], "analytic"):
+            kmat = analytic_exchange_block(read_basis(element_path / "hf_q-vSZP.inp"))
+        if cache is not None and key is not None:
+            cache.store(key, kmat)
+        with timings.stage(PSE_SYMBOLS[ati], "average"):
+            msindo_xc_ints = average_exchange_block(kmat, ati, args.verbose)
+        save_result(element_path, msindo_xc_ints, kmat)
+        return msindo_xc_ints, kmat
+    # Read in the json file
+    jsonfile = element_path / "hf_q-vSZP.json"
+    if args.exchange_only and not args.legacy:
+        with timings.stage(PSE_SYMBOLS[ati], "parse"):
+            kmat = read_exchange_block(jsonfile)
+        if cache is not None and key is not None:
+            cache.store(key, kmat)
+        with timings.stage(PSE_SYMBOLS[ati], "average"):
+            msindo_xc_ints = average_exchange_block(kmat, ati, args.verbose)
+        save_result(element_path, msindo_xc_ints, kmat)
+        return msindo_xc_ints, kmat
+    jsonhandler = (
+        jsonhandler_resorting_legacy if args.legacy else jsonhandler_no_resorting
+    )
+    with timings.stage(
+        PSE_SYMBOLS[ati], "parse", outputs=list(sidecar_paths(jsonfile))
+    ):
+        twoelints = jsonhandler(
+            jsonfile,
+            PSE_SYMBOLS[ati],
+            args.verbose,
+            packed=args.packed,
+            dump_format=args.dump,
+            writer=dump_writer,
+        )
+
+    if args.verbose and args.legacy:
+        # print the twoelints numpy array
+        print(twoelints)
+
+    if args.legacy:
+        with timings.stage(PSE_SYMBOLS[ati], "average"):
+            msindo_xc_ints = modtwoelints_analytic_average_legacy(
+                twoelints, ati, args.verbose
+            )
+        save_result(element_path, msindo_xc_ints, None)
+        return msindo_xc_ints, None
+    with timings.stage(PSE_SYMBOLS[ati], "average"):
+        kmat = exchange_block(twoelints)
+        msindo_xc_ints = average_exchange_block(kmat, ati, args.verbose)
+    if cache is not None and key is not None:
+        cache.store(key, kmat)
+    save_result(element_path, msindo_xc_ints, kmat)
+    return msindo_xc_ints, kmat
+
+
+def process_element(
+    ati: int,
+    args: argparse.Namespace,
+    q_cn_dict: dict[str, dict[str, float]],
+    binaries: dict[str, str],
+    cache: ResultCache | None,
+    dump_writer: DumpWriter | None,
+    timings: Timings,
+    ranks: dict[int, int] | None = None,
+    budget: CoreBudget | None = None,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Run the calculation (if desired) for a single element and return
+    its shell-averaged exchange integrals and (except for the legacy mode)
+    its exchange integrals K[j, i] = ints[j, i, j, i].
+    All stages are timed in `timings`. The calculation uses ranks[ati]
+    (default: --mpi) MPI ranks, which are reserved in the core `budget` if given.
+    """
+    result, key, chargemodel = setup_element(ati, args, q_cn_dict, binaries, cache)
+    if result is not None:
+        return result
+    if chargemodel is not None:
+        guess = element_guess(ati, args, q_cn_dict)
+        mpi = ranks[ati] if ranks is not None else args.mpi
+        with (
+            budget.reserve(mpi) if budget is not None else contextlib.nullcontext(),
+            scratch_directory(
+                Path(PSE_SYMBOLS[ati]).resolve(),
+                PSE_SYMBOLS[ati],
+                args.scratch,
+                keep_gbw(args),
+            ) as workdir,
+        ):
+            run_calculation(
+                PSE_SYMBOLS[ati],
+                workdir,
+                chargemodel,
+                binaries,
+                mpi,
+                args.verbose,
+                # with --analytic, only the input with the basis set is needed
+                dry_run=args.dry_run or args.analytic,
+                timings=timings,
+                guess=guess,
             )
-        except sp.CalledProcessError as err:
-            print(f"Error in qvSZP execution:\n{err.stderr}")
-            raise SystemExit(1) from err
-        if args.verbose:
-            print("Output: ", process.stdout)
         if args.dry_run:
             sys.exit(0)
+    return analyse_element(ati, key, args, cache, dump_writer, timings)
 
-        with open(element_path / "orca.out", "w", encoding="utf8") as f:
-            try:
-                process = sp.run(
-                    [orca_binary, "hf_q-vSZP.inp"],
-                    stdout=f,
-                    cwd=element_path,
-                    check=True,
-                    text=True,
-                )
-            except sp.CalledProcessError as err:
-                print(f"Error in ORCA execution:\n{err.stderr}")
-                raise SystemExit(1) from err
-        f.close()
 
-        with open(element_path / "orca_2json.out", "w", encoding="utf8") as f:
+def run_elements_async(
+    elements: list[int],
+    args: argparse.Namespace,
+    q_cn_dict: dict[str, dict[str, float]],
+    binaries: dict[str, str],
+    cache: ResultCache | None,
+    dump_writer: DumpWriter,
+    timings: Timings,
+    n_jobs: int,
+    ranks: dict[int, int] | None = None,
+    cores: int | None = None,
+) -> dict[int, Any]:
+    """
+    Process the elements with the asyncio pipeline (see pipeline.py), in which
+    the analysis of finished elements overlaps with the calculations of the
+    next ones. Each calculation uses ranks[ati] (default: --mpi) MPI ranks
+    of at most `cores` cores in total (if given).
+    Returns the result or the raised exception per element.
+    """
+    # pylint: disable=import-outside-toplevel
+    import asyncio
+    from pipeline import (
+        AsyncCoreBudget,
+        StageLimits,
+        run_calculation_async,
+        run_pipeline,
+    )
+
+    stage_jobs = {
+        "qvSZP": args.qvszp_jobs,
+        "ORCA": args.orca_jobs,
+        "orca_2json": args.json_jobs,
+        "analysis": args.analysis_jobs,
+    }
+    limits = StageLimits(
+        n_jobs,
+        {stage: jobs for stage, jobs in stage_jobs.items() if jobs is not None},
+        queue_size=args.queue_size,
+    )
+    print(
+        "Stage limits: "
+        + ", ".join(f"{stage}: {jobs}" for stage, jobs in limits.stages.items())
+    )
+
+    budget = AsyncCoreBudget(cores) if cores is not None else None
+
+    async def calculate(ati: int, chargemodel: str) -> None:
+        element_path = Path(PSE_SYMBOLS[ati]).resolve()
+        guess = await asyncio.to_thread(element_guess, ati, args, q_cn_dict)
+        mpi = ranks[ati] if ranks is not None else args.mpi
+        async with (
+            budget.reserve(mpi) if budget is not None else contextlib.nullcontext()
+        ):
+            workdir = element_path
+            if args.scratch is not None:
+                workdir = await asyncio.to_thread(
+                    stage_in, element_path, PSE_SYMBOLS[ati], args.scratch
+                )
             try:
-                process = sp.run(
-                    ["orca_2json", "hf_q-vSZP.gbw"],
-                    stdout=f,
-                    cwd=element_path,
-                    check=True,
-                    text=True,
+                await run_calculation_async(
+                    PSE_SYMBOLS[ati],
+                    workdir,
+                    chargemodel,
+                    binaries,
+                    mpi,
+                    args.verbose,
+                    limits,
+                    timings,
+                    guess=guess,
                 )
-            except sp.CalledProcessError as err:
-                print(f"Error in orca_2json execution:\n{err.stderr}")
-                raise SystemExit(1) from err
-        f.close()
+            finally:
+                if args.scratch is not None:
+                    await asyncio.to_thread(
+                        stage_out, workdir, element_path, keep_gbw(args)
+                    )
 
-    # Read in the json file
-    if args.legacy:
-        twoelints = jsonhandler_resorting_legacy(
-            element_path / "hf_q-vSZP.json", PSE_SYMBOLS[i], args.verbose
+    return asyncio.run(
+        run_pipeline(
+            elements,
+            partial(
+                setup_element,
+                args=args,
+                q_cn_dict=q_cn_dict,
+                binaries=binaries,
+                cache=cache,
+            ),
+            calculate,
+            partial(
+                analyse_element,
+                args=args,
+                cache=cache,
+                dump_writer=dump_writer,
+                timings=timings,
+            ),
+            limits,
         )
+    )
+
+
+def select_elements(args: argparse.Namespace) -> list[int]:
+    """
+    Atomic numbers of the elements selected with --specific_element or
+    --elements (default: all elements H-Lr).
+    """
+    if args.specific_element:
+        return [PSE_NUMBERS[args.specific_element]]
+    if args.elements is None:
+        return list(range(1, 104))
+    elements: list[int] = []
+    for entry in args.elements.split(","):
+        entry = entry.strip().lower()
+        if entry in PSE_NUMBERS:
+            elements.append(PSE_NUMBERS[entry])
+        elif "-" in entry:
+            first, last = entry.split("-", 1)
+            elements.extend(range(int(first), int(last) + 1))
+        else:
+            elements.append(int(entry))
+    invalid = [ati for ati in elements if not 0 < ati < 104]
+    if invalid:
+        raise ValueError(f"Elements {invalid} are out of range (1-103).")
+    return sorted(set(elements))
+
+
+def submit_batch(
+    args: argparse.Namespace, argv: list[str], elements: list[int], n_jobs: int
+) -> int:
+    """
+    Run the elements as job array: one array task per shard runs main.py --shard
+    for its elements, the merge step runs main.py --merge.
+    Returns the exit code.
+    """
+    command = [sys.executable, str(Path(__file__).resolve())]
+    forwarded = strip_options(argv, BATCH_OPTIONS)
+    if args.schedule == "cost":
+        costs = estimate_costs(elements, load_history(Path(args.history)), PSE_SYMBOLS)
+        shards = balance_shards(costs, args.shards or len(elements))
+    else:
+        shards = shard_elements(elements, args.shards or len(elements))
+    tasks = [
+        command
+        + forwarded
+        + ["--elements", ",".join(PSE_SYMBOLS[ati] for ati in shard), "--shard"]
+        for shard in shards
+    ]
+    merge = (
+        command
+        + forwarded
+        + [
+            "--elements",
+            ",".join(PSE_SYMBOLS[ati] for ati in elements),
+            "--merge",
+        ]
+    )
+    print(f"Running {len(elements)} element(s) in {len(tasks)} array task(s).")
+    if args.batch == "slurm":
+        SlurmArrayBackend(
+            Path.cwd(), ntasks=args.mpi, options=args.sbatch, submit=args.submit
+        ).submit(tasks, merge)
+        return 0
+    backend = LocalArrayBackend(Path.cwd(), max_parallel=n_jobs)
+    backend.submit(tasks, merge)
+    return int(any(backend.returncodes) or bool(backend.merge_returncode))
+
+
+def run_scan_mode(
+    args: argparse.Namespace,
+    elements: list[int],
+    binaries: dict[str, str],
+    n_jobs: int,
+) -> int:
+    """
+    Calculate the elements on the (q, CN) grid of --scan-q/--scan-cn and fill the
+    scan table (see scan.py). Returns the exit code.
+    """
+    q_grid = parse_grid(args.scan_q)
+    cn_grid = parse_grid(args.scan_cn)
+    table = open_table(Path(args.scan_table), q_grid, cn_grid)
+    timings = Timings()
+    bases = guess_bases(args)
+    failures = run_scan(
+        table,
+        elements,
+        q_grid,
+        cn_grid,
+        lambda ati, q, cn: run_point(
+            ati,
+            PSE_SYMBOLS[ati],
+            q,
+            cn,
+            binaries,
+            args.mpi,
+            timings,
+            args.scratch,
+            guess_bases=bases,
+            analytic=args.analytic,
+        ),
+        n_jobs,
+    )
+    print(f"Scan table written to {args.scan_table}.")
+    if timings.records:
+        timings.write()
+    if failures:
+        with open(SCAN_FAILURES_FILE, "w", encoding="utf8") as f:
+            json.dump(failures, f, indent=2)
+        f.close()
+        print(f"{len(failures)} point(s) failed, see {SCAN_FAILURES_FILE}.")
+        print("Rerun the scan to only compute the missing points.")
+        return 1
+    Path(SCAN_FAILURES_FILE).unlink(missing_ok=True)
+    return 0
+
+
+def compress_exchange_blocks(
+    kblocks: np.ndarray, elements: list[int] | None = None
+) -> None:
+    """
+    Fit the Slater-Condon parameters of all elements (see slatercondon.py) and
+    write them to SLATER_CONDON_FILE. Elements whose integrals are not
+    described by the parameters are reported.
+    If `elements` is given, only their parameters are fitted, the ones of the
+    other elements are kept from an existing SLATER_CONDON_FILE.
+    """
+    if elements is None:
+        parameters, residuals = fit_slater_condon(kblocks)
+        atomic_numbers = np.arange(kblocks.shape[0])
     else:
-        twoelints = jsonhandler_no_resorting(
-            element_path / "hf_q-vSZP.json", PSE_SYMBOLS[i], args.verbose
+        atomic_numbers = np.array(elements, dtype=int)
+        parameters = np.zeros((kblocks.shape[0], len(PARAMETERS)))
+        if Path(SLATER_CONDON_FILE).is_file():
+            parameters = np.load(SLATER_CONDON_FILE)
+        parameters[atomic_numbers], residuals = fit_slater_condon(
+            kblocks[atomic_numbers], atomic_numbers
+        )
+    np.save(SLATER_CONDON_FILE, parameters)
+    deviating = [
+        PSE_SYMBOLS[int(ati)]
+        for ati in atomic_numbers[np.flatnonzero(residuals > FIT_TOLERANCE)]
+    ]
+    if deviating:
+        print(
+            f"Slater-Condon fit residual above {FIT_TOLERANCE:.0e} for "
+            + f"{', '.join(deviating)} (max. {residuals.max():.3e})."
         )
 
-    if args.verbose and args.legacy:
-        # print the twoelints numpy array
-        print(twoelints)
 
-    if args.legacy:
-        msindo_xc_ints = modtwoelints_analytic_average_legacy(
-            twoelints, i, args.verbose
+def check_analytic(elements: list[int]) -> int:
+    """
+    Compare the analytic exchange integrals with the ones in the JSON files
+    of the already calculated elements (see analyticints.compare_with_json).
+    Returns the exit code (1 if a deviation exceeds ANALYTIC_TOLERANCE).
+    """
+    nfailed = 0
+    for ati in elements:
+        element_path = Path(PSE_SYMBOLS[ati]).resolve()
+        if not (
+            (element_path / "hf_q-vSZP.inp").is_file()
+            and json_complete(element_path / "hf_q-vSZP.json")
+        ):
+            continue
+        absolute, relative = compare_with_json(element_path)
+        status = "ok" if absolute <= ANALYTIC_TOLERANCE else "DEVIATES"
+        nfailed += status != "ok"
+        print(
+            f"{PSE_SYMBOLS[ati]:<3} max. deviation {absolute:.3e} "
+            + f"(relative {relative:.3e}) {status}"
         )
-    else:
-        msindo_xc_ints = average_shell_exchange_integrals(twoelints, i, args.verbose)
-    # incorporate the msindo xc integrals into the onecenterxcints array for the current element
-    # the whole vector of size 5 is copied into the array at the position of the current element
-    onecxcints[:, i] = msindo_xc_ints
-
-if args.verbose:
-    # print the onecenterxcints array
-    print("Final 1c-XC ints:")
-    print(onecxcints)
-
-# dump onexcints to a file for later use
-np.save("onecxcints.npy", onecxcints)
-# plot the onecenterxcints array
-plot_onexc_ints(onecxcints)
-# write the onecenterxcints array to Fortran code.
-write_fortran_array(onecxcints, "onecxcints_array.f90")
-write_fortran_data(onecxcints, "onecxcints_data.f90")
+    return int(nfailed > 0)
+
+
+def merge_results(
+    elements: list[int], legacy: bool
+) -> tuple[np.ndarray, np.ndarray, list[int]]:
+    """
+    Collect the per-element results (see save_result) of a sharded run.
+    The results of the other elements are kept from existing onecxcints.npy and
+    EXCHANGE_BLOCKS_FILE files.
+
+    Returns:
+        tuple: onecxcints array, stacked exchange integrals and the atomic numbers
+               of the elements without (valid) result.
+    """
+    onecxcints = np.zeros((9, 104))
+    kblocks = np.zeros((104, NAO_MAX, NAO_MAX))
+    if Path("onecxcints.npy").is_file():
+        onecxcints = np.load("onecxcints.npy")
+    if Path(EXCHANGE_BLOCKS_FILE).is_file() and not legacy:
+        kblocks = np.load(EXCHANGE_BLOCKS_FILE)
+    missing: list[int] = []
+    for ati in elements:
+        result = load_result(Path(PSE_SYMBOLS[ati]).resolve())
+        # only results of the same mode (legacy or not) are used
+        if result is None or (result[1] is None) != legacy:
+            missing.append(ati)
+            continue
+        onecxcints[:, ati] = result[0]
+        if result[1] is not None:
+            kblocks[ati] = result[1]
+    return onecxcints, kblocks, missing
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Run the calculations for all (or the selected) elements, average the
+    exchange integrals and write the results.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser().parse_args(argv)
+    q_cn_dict: dict[str, dict[str, float]] = {}
+    if args.external_charges:
+        if args.verbose:
+            print("Using external charges")
+        q_cn_dict = read_q_cn(Path("q_cn.dat").resolve(), args.verbose)
+
+    if args.specific_element:
+        if args.specific_element not in PSE_NUMBERS:
+            raise ValueError(
+                f"Element {args.specific_element} not in the periodic table."
+            )
+    elements = select_elements(args)
+
+    if args.interpolate is not None:
+        table, q_grid, cn_grid = load_table(Path(args.scan_table))
+        for ati in elements:
+            averages = interpolate(table, q_grid, cn_grid, ati, *args.interpolate)
+            print(f"{PSE_SYMBOLS[ati]:<3} " + " ".join(f"{x:10.6f}" for x in averages))
+        sys.exit(0)
+    if args.analytic_check:
+        sys.exit(check_analytic(elements))
+    if args.analytic and args.legacy:
+        raise ValueError("--analytic is not available in the legacy mode.")
+    scan = args.scan_q is not None or args.scan_cn is not None
+    if scan and (args.scan_q is None or args.scan_cn is None):
+        raise ValueError("The scan mode requires both --scan-q and --scan-cn.")
+
+    if args.merge:
+        onecxcints, kblocks, missing = merge_results(elements, args.legacy)
+        np.save("onecxcints.npy", onecxcints)
+        if not args.legacy:
+            np.save(EXCHANGE_BLOCKS_FILE, kblocks)
+            compress_exchange_blocks(
+                kblocks, [ati for ati in elements if ati not in missing]
+            )
+        write_outputs(onecxcints, args)
+        if missing:
+            with open(FAILURES_FILE, "w", encoding="utf8") as f:
+                json.dump(
+                    {PSE_SYMBOLS[ati]: "no result" for ati in missing}, f, indent=2
+                )
+            f.close()
+            print(f"{len(missing)} element(s) without result.")
+            print(f"They are written to {FAILURES_FILE}.")
+            print("Rerun with --resume to only compute the missing elements.")
+            sys.exit(1)
+        Path(FAILURES_FILE).unlink(missing_ok=True)
+        sys.exit(0)
+
+    if args.reaverage:
+        # average all elements at once from the stored exchange integrals
+        if Path(EXCHANGE_BLOCKS_FILE).is_file():
+            kblocks = np.load(EXCHANGE_BLOCKS_FILE)
+        else:
+            print(f"Regenerating the exchange integrals from {SLATER_CONDON_FILE}")
+            kblocks = exchange_blocks_from_parameters(np.load(SLATER_CONDON_FILE))
+        onecxcints = average_shell_exchange_integrals_batched(kblocks)
+        np.save("onecxcints.npy", onecxcints)
+        write_outputs(onecxcints, args)
+        sys.exit(0)
+
+    cache = None
+    if args.cache_dir is not None:
+        if args.legacy:
+            raise ValueError("The result cache is not available in the legacy mode.")
+        cache = ResultCache(args.cache_dir)
+        print(f"Using result cache in {cache.directory}")
+
+    onecxcints = np.zeros((9, 104))
+    kblocks = np.zeros((104, NAO_MAX, NAO_MAX))
+    if Path(EXCHANGE_BLOCKS_FILE).is_file():
+        kblocks = np.load(EXCHANGE_BLOCKS_FILE)
+    # if onexcints.npy is a file, load it and plot it
+    if Path("onecxcints.npy").is_file() and not (args.shard or args.batch or scan):
+        onecxcints = np.load("onecxcints.npy")
+        write_outputs(onecxcints, args)
+        if args.read_only:
+            sys.exit(0)
+
+    # qvSZP and ORCA are only required if calculations are performed
+    binaries: dict[str, str] = {} if args.read_only or args.batch else find_binaries()
+
+    # number of elements that are processed concurrently.
+    # If the total number of cores is given, the jobs are limited such that
+    # jobs * MPI ranks does not oversubscribe the node.
+    n_jobs: int = args.jobs if args.jobs is not None else 1
+    if args.cores is not None:
+        max_jobs = max(1, args.cores // args.mpi)
+        n_jobs = max_jobs if args.jobs is None else min(args.jobs, max_jobs)
+    if args.dry_run:
+        n_jobs = 1
+
+    if args.batch:
+        sys.exit(submit_batch(args, argv, elements, n_jobs))
+    if scan:
+        sys.exit(run_scan_mode(args, elements, binaries, n_jobs))
+
+    # MPI ranks per element and total number of cores in use
+    ranks = {ati: args.mpi for ati in elements}
+    cores: int | None = None
+    if args.schedule == "cost" and not args.dry_run:
+        costs = estimate_costs(elements, load_history(Path(args.history)), PSE_SYMBOLS)
+        elements = longest_first(costs)
+        ranks = assign_ranks(costs, args.mpi)
+        cores = args.cores if args.cores is not None else n_jobs * args.mpi
+        # the number of concurrent elements is limited by the core budget
+        n_jobs = min(len(elements), cores, args.jobs or cores)
+        print(
+            f"Cost schedule on {cores} core(s), longest first: "
+            + ", ".join(f"{PSE_SYMBOLS[ati]} ({ranks[ati]})" for ati in elements[:10])
+            + (", ..." if len(elements) > 10 else "")
+        )
+
+    # print current directory via pathlib
+    print("Current working directory:", Path.cwd())
+    print(f"Processing {len(elements)} element(s) with {n_jobs} concurrent job(s).")
+    failures: dict[str, str] = {}
+    timings = Timings()
+
+    def collect(ati: int, outcome: Any) -> None:
+        # failures are recorded per element instead of aborting the sweep
+        if isinstance(outcome, (CalculationError, OSError, ValueError)):
+            print(f"Element {PSE_SYMBOLS[ati]} failed: {outcome}")
+            failures[PSE_SYMBOLS[ati]] = str(outcome)
+            return
+        if isinstance(outcome, BaseException):
+            raise outcome
+        msindo_xc_ints, kmat = outcome
+        # incorporate the msindo xc integrals into the onecenterxcints array
+        # for the current element
+        # the whole vector is copied into the array at the position of the element
+        onecxcints[:, ati] = msindo_xc_ints
+        if kmat is not None:
+            kblocks[ati] = kmat
+
+    with DumpWriter() as dump_writer:
+        # without ORCA runs, there is nothing to overlap the analysis with
+        if args.use_async and not args.dry_run and not args.analytic:
+            outcomes = run_elements_async(
+                elements,
+                args,
+                q_cn_dict,
+                binaries,
+                cache,
+                dump_writer,
+                timings,
+                n_jobs,
+                ranks=ranks,
+                cores=cores,
+            )
+            for ati in elements:
+                collect(ati, outcomes[ati])
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                run_element = partial(
+                    process_element,
+                    args=args,
+                    q_cn_dict=q_cn_dict,
+                    binaries=binaries,
+                    cache=cache,
+                    dump_writer=dump_writer,
+                    timings=timings,
+                    ranks=ranks,
+                    budget=CoreBudget(cores) if cores is not None else None,
+                )
+                futures = {executor.submit(run_element, i): i for i in elements}
+                try:
+                    for future in as_completed(futures):
+                        try:
+                            result = future.result()
+                        except (CalculationError, OSError, ValueError) as err:
+                            collect(futures[future], err)
+                            continue
+                        collect(futures[future], result)
+                except BaseException:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+
+    if args.shard:
+        # the results are assembled by the merge step
+        task = os.environ.get("SLURM_ARRAY_TASK_ID", PSE_SYMBOLS[elements[0]])
+        timings.write(f"{TIMINGS_PREFIX}_{task}")
+        if failures:
+            print(f"{len(failures)} element(s) failed ({', '.join(failures)}).")
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.verbose:
+        # print the onecenterxcints array
+        print("Final 1c-XC ints:")
+        print(onecxcints)
+
+    # dump onexcints and the exchange integrals to a file for later use
+    np.save("onecxcints.npy", onecxcints)
+    if not args.legacy:
+        np.save(EXCHANGE_BLOCKS_FILE, kblocks)
+        compress_exchange_blocks(kblocks)
+    # plot the onecenterxcints array and write it to Fortran code.
+    write_outputs(onecxcints, args)
+
+    if timings.records:
+        timings.write()
+        print(timings.summary())
+        print(f"Timings are written to {TIMINGS_PREFIX}.json/.csv.")
+        if not args.analytic:
+            update_history(
+                Path(args.history),
+                timings.records,
+                {PSE_SYMBOLS[ati]: ranks[ati] for ati in elements},
+            )
+
+    if failures:
+        with open(FAILURES_FILE, "w", encoding="utf8") as f:
+            json.dump(failures, f, indent=2)
+        f.close()
+        print(f"{len(failures)} element(s) failed ({', '.join(failures)}).")
+        print(f"Error messages are written to {FAILURES_FILE}.")
+        print("Rerun with --resume to only compute the missing elements.")
+        sys.exit(1)
+    Path(FAILURES_FILE).unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+This module contains a container for two-electron integrals that stores only
+the symmetry-unique non-zero integrals.
+
+Using the 8-fold permutational symmetry of real integrals,
+(pq|rs) = (qp|rs) = (pq|sr) = (qp|sr) = (rs|pq) = (sr|pq) = (rs|qp) = (sr|qp),
+every integral is mapped to a canonical packed-triangular index:
+    pq  = p * (p + 1) / 2 + q         with p >= q
+    rs  = r * (r + 1) / 2 + s         with r >= s
+    key = pq * (pq + 1) / 2 + rs      with pq >= rs
+Only the sorted keys and the corresponding values are kept (COO layout),
+so that the memory scales with the number of non-zero integrals instead of N^4.
+"""
+
+import numpy as np
+
+
+def pair_index(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    Packed-triangular index of the (unordered) index pair (p, q).
+    """
+    p = np.asarray(p, dtype=np.int64)
+    q = np.asarray(q, dtype=np.int64)
+    high = np.maximum(p, q)
+    return high * (high + 1) // 2 + np.minimum(p, q)
+
+
+def split_pair_index(pq: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Inverse of pair_index: return (p, q) with p >= q.
+    """
+    pq = np.asarray(pq, dtype=np.int64)
+    p = ((np.sqrt(8.0 * pq + 1.0) - 1.0) // 2).astype(np.int64)
+    # correct possible rounding errors of the floating-point square root
+    p = np.where(p * (p + 1) // 2 > pq, p - 1, p)
+    p = np.where((p + 1) * (p + 2) // 2 <= pq, p + 1, p)
+    return p, pq - p * (p + 1) // 2
+
+
+def canonical_keys(
+    p: np.ndarray, q: np.ndarray, r: np.ndarray, s: np.ndarray
+) -> np.ndarray:
+    """
+    Canonical key of the integral (pq|rs) that is identical for all
+    symmetry-equivalent index orders. The arguments are broadcast.
+    """
+    return pair_index(pair_index(p, q), pair_index(r, s))
+
+
+class PackedIntegrals:
+    """
+    Symmetry-packed sparse storage of two-electron integrals.
+
+    The integrals can be accessed like a four-dimensional numpy array
+    (ints[p, q, r, s], also with broadcastable index arrays),
+    so that the averaging routines in inthandler can use it directly.
+    Integrals that are not stored (including indices beyond `nao`) are zero.
+    """
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray, nao: int) -> None:
+        """
+        Args:
+            keys (np.ndarray): Sorted, unique canonical keys.
+            values (np.ndarray): Integral values belonging to the keys.
+            nao (int): Number of AOs.
+        """
+        self.keys = keys
+        self.values = values
+        self.nao = nao
+
+    @classmethod
+    def from_rows(
+        cls,
+        indices: np.ndarray,
+        values: np.ndarray,
+        nao: int | None = None,
+        threshold: float = 0.0,
+    ) -> "PackedIntegrals":
+        """
+        Build the container from 2-el integral rows.
+        If a symmetry-equivalent integral occurs more than once,
+        the last occurrence is kept.
+
+        Args:
+            indices (np.ndarray): AO indices p, q, r, s with shape (n, 4).
+            values (np.ndarray): Integral values with shape (n,).
+            nao (int | None): Number of AOs. Determined from the indices if None.
+            threshold (float): Integrals with an absolute value <= threshold
+                               are not stored.
+
+        Returns:
+            PackedIntegrals: The packed integrals.
+        """
+        indices = np.asarray(indices)
+        values = np.asarray(values, dtype=np.float64)
+        if nao is None:
+            nao = int(indices.max()) + 1 if indices.shape[0] else 0
+        keys = canonical_keys(
+            indices[:, 0], indices[:, 1], indices[:, 2], indices[:, 3]
+        )
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        values = values[order]
+        # keep the last occurrence of each key
+        last = np.ones(keys.shape[0], dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        nonzero = last & (np.abs(values) > threshold)
+        return cls(keys[nonzero], values[nonzero], nao)
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    def __repr__(self) -> str:
+        return f"PackedIntegrals(nao={self.nao}, nonzero={len(self)})"
+
+    def __str__(self) -> str:
+        # same output as for the dense array, e.g. for the verbose legacy mode
+        return str(self.todense())
+
+    @property
+    def shape(self) -> tuple[int, int, int, int]:
+        """
+        Shape of the equivalent dense array.
+        """
+        return (self.nao, self.nao, self.nao, self.nao)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory consumed by the keys and values.
+        """
+        return self.keys.nbytes + self.values.nbytes
+
+    def gather(
+        self, p: np.ndarray, q: np.ndarray, r: np.ndarray, s: np.ndarray
+    ) -> np.ndarray:
+        """
+        Vectorized lookup of the integrals (pq|rs).
+        The index arrays are broadcast against each other.
+        """
+        keys = canonical_keys(p, q, r, s)
+        if not self.keys.shape[0]:
+            return np.zeros(keys.shape)
+        pos = np.minimum(np.searchsorted(self.keys, keys), self.keys.shape[0] - 1)
+        return np.where(self.keys[pos] == keys, self.values[pos], 0.0)
+
+    def get(self, p: int, q: int, r: int, s: int) -> float:
+        """
+        Value of a single integral (pq|rs).
+        """
+        return float(
+            self.gather(np.asarray(p), np.asarray(q), np.asarray(r), np.asarray(s))
+        )
+
+    def __getitem__(self, key: tuple) -> float | np.ndarray:
+        if not isinstance(key, tuple) or len(key) != 4:
+            raise IndexError("PackedIntegrals must be indexed with four indices.")
+        if all(np.ndim(k) == 0 for k in key):
+            return self.get(*key)
+        return self.gather(*key)
+
+    def todense(self) -> np.ndarray:
+        """
+        Expand the integrals to a dense four-dimensional array
+        (including all symmetry-equivalent entries).
+        """
+        dense = np.zeros(self.shape)
+        pq, rs = split_pair_index(self.keys)
+        p, q = split_pair_index(pq)
+        r, s = split_pair_index(rs)
+        for a, b, c, d in (
+            (p, q, r, s),
+            (q, p, r, s),
+            (p, q, s, r),
+            (q, p, s, r),
+            (r, s, p, q),
+            (s, r, p, q),
+            (r, s, q, p),
+            (s, r, q, p),
+        ):
+            dense[a, b, c, d] = self.values
+        return dense
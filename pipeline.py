@@ -0,0 +1,241 @@
+"""
+This module contains an asyncio-based pipeline for the calculations of many elements.
+
+The external programs (qvSZP, ORCA, orca_2json) are run with
+asyncio.create_subprocess_exec, each with its own concurrency limit.
+Finished elements are passed through a bounded queue to analysis workers that
+parse and average the integrals in a thread pool, so that the analysis of
+finished elements overlaps with the ORCA runs of the next ones.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, TextIO
+from calculation import CalculationError, qvszp_command, scf_details, warm_start
+from instrument import Timings
+
+# stages with a concurrency limit
+STAGES: tuple[str, ...] = ("qvSZP", "ORCA", "orca_2json", "analysis")
+
+
+class StageLimits:
+    """
+    Concurrency limits of the pipeline.
+
+    Args:
+        jobs (int): Number of elements that are processed concurrently.
+        stages (dict[str, int]): Maximum number of concurrent runs per stage
+                                 (see STAGES). Stages that are not given
+                                 are limited by `jobs`.
+        queue_size (int): Number of calculated elements that may wait for the
+                          analysis. If the queue is full, no further
+                          calculations are started.
+    """
+
+    def __init__(
+        self, jobs: int, stages: dict[str, int] | None = None, queue_size: int = 4
+    ) -> None:
+        self.jobs = jobs
+        self.stages = {stage: jobs for stage in STAGES}
+        self.stages.update(stages or {})
+        self.queue_size = queue_size
+        self.semaphores = {
+            stage: asyncio.Semaphore(limit) for stage, limit in self.stages.items()
+        }
+
+
+class AsyncCoreBudget:
+    """
+    Core budget of the pipeline (see costmodel.CoreBudget): a calculation
+    with n MPI ranks waits until n cores are free.
+
+    Args:
+        cores (int): Total number of cores.
+    """
+
+    def __init__(self, cores: int) -> None:
+        self.cores = cores
+        self.free = cores
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, ncores: int) -> AsyncIterator[None]:
+        """
+        Hold `ncores` cores (at most all cores) while the block runs.
+        """
+        ncores = min(ncores, self.cores)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.free >= ncores)
+            self.free -= ncores
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.free += ncores
+                self._condition.notify_all()
+
+
+async def run_program_async(
+    command: list[str], cwd: Path, stdout: TextIO | None = None
+) -> tuple[int, str, str]:
+    """
+    Run an external program and return its exit code, output (if not written
+    to `stdout`) and error output. The program is killed if the task is cancelled.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        cwd=cwd,
+        stdout=stdout if stdout is not None else asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        output, errors = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    assert process.returncode is not None
+    return (
+        process.returncode,
+        (output or b"").decode("utf8", errors="replace"),
+        errors.decode("utf8", errors="replace"),
+    )
+
+
+async def run_calculation_async(
+    symbol: str,
+    element_path: Path,
+    chargemodel: str,
+    binaries: dict[str, str],
+    mpi: int,
+    verb: bool,
+    limits: StageLimits,
+    timings: Timings,
+    guess: Path | None = None,
+) -> None:
+    """
+    Run qvSZP, ORCA and orca_2json in the (prepared) element directory
+    (see calculation.run_calculation), starting the SCF from the orbitals
+    in `guess` if given.
+    The wall time of each program is recorded in `timings`. CPU time and peak RSS
+    are not available, since the child processes are reaped by the event loop.
+    """
+    steps = (
+        (
+            "qvSZP",
+            qvszp_command(binaries["qvSZP"], symbol + ".xyz", chargemodel, mpi),
+            None,
+            element_path / "hf_q-vSZP.inp",
+        ),
+        (
+            "ORCA",
+            [binaries["orca"], "hf_q-vSZP.inp"],
+            element_path / "orca.out",
+            element_path / "hf_q-vSZP.gbw",
+        ),
+        (
+            "orca_2json",
+            ["orca_2json", "hf_q-vSZP.gbw"],
+            element_path / "orca_2json.out",
+            element_path / "hf_q-vSZP.json",
+        ),
+    )
+    for stage, command, outfile, product in steps:
+        async with limits.semaphores[stage]:
+            with timings.stage(symbol, stage, outputs=[product]) as record:
+                record.update(cpu_s=None, max_rss_bytes=None)
+                if outfile is None:
+                    returncode, output, errors = await run_program_async(
+                        command, element_path
+                    )
+                else:
+                    with open(outfile, "w", encoding="utf8") as f:
+                        returncode, output, errors = await run_program_async(
+                            command, element_path, stdout=f
+                        )
+                    f.close()
+                if stage == "ORCA":
+                    record.update(scf_details(element_path / "orca.out", guess))
+                if returncode != 0:
+                    print(f"Error in {stage} execution:\n{errors}")
+                    raise CalculationError(f"{stage} failed for {symbol}")
+        if verb and outfile is None:
+            print("Output: ", output)
+        if stage == "qvSZP" and guess is not None:
+            warm_start(element_path / "hf_q-vSZP.inp", guess)
+
+
+async def run_pipeline(
+    elements: list[int],
+    setup: Callable[[int], tuple[Any, str | None, str | None]],
+    calculate: Callable[[int, str], Awaitable[None]],
+    analyse: Callable[[int, str | None], Any],
+    limits: StageLimits,
+) -> dict[int, Any]:
+    """
+    Process the elements in a pipeline of three stages.
+
+    Args:
+        elements (list[int]): Atomic numbers of the elements.
+        setup (Callable): setup(ati) -> (result, key, chargemodel) prepares an
+            element (run in a thread). If `result` is not None, the element is
+            already finished. If `chargemodel` is None, no calculation is
+            required and the element is only analysed.
+        calculate (Callable): Coroutine function calculate(ati, chargemodel)
+            that runs the external programs.
+        analyse (Callable): analyse(ati, key) -> result parses and averages
+            the integrals (run in a thread pool with limits.stages["analysis"]
+            workers).
+        limits (StageLimits): Concurrency limits.
+
+    Returns:
+        dict[int, Any]: Result or raised exception per element.
+    """
+    outcomes: dict[int, Any] = {}
+    pending: asyncio.Queue = asyncio.Queue()
+    for ati in elements:
+        pending.put_nowait(ati)
+    finished: asyncio.Queue = asyncio.Queue(maxsize=limits.queue_size)
+    loop = asyncio.get_running_loop()
+
+    async def compute_worker() -> None:
+        while not pending.empty():
+            ati = pending.get_nowait()
+            try:
+                result, key, chargemodel = await asyncio.to_thread(setup, ati)
+                if result is not None:
+                    outcomes[ati] = result
+                    continue
+                if chargemodel is not None:
+                    await calculate(ati, chargemodel)
+            except Exception as err:  # pylint: disable=broad-except
+                outcomes[ati] = err
+                continue
+            # blocks if too many calculated elements wait for the analysis
+            await finished.put((ati, key))
+
+    async def analysis_worker(executor: ThreadPoolExecutor) -> None:
+        while True:
+            item = await finished.get()
+            if item is None:
+                return
+            ati, key = item
+            try:
+                outcomes[ati] = await loop.run_in_executor(executor, analyse, ati, key)
+            except Exception as err:  # pylint: disable=broad-except
+                outcomes[ati] = err
+
+    n_analysis = limits.stages["analysis"]
+    with ThreadPoolExecutor(max_workers=n_analysis) as executor:
+        analysis = [
+            asyncio.create_task(analysis_worker(executor)) for _ in range(n_analysis)
+        ]
+        await asyncio.gather(
+            *(compute_worker() for _ in range(min(limits.jobs, len(elements))))
+        )
+        for _ in analysis:
+            await finished.put(None)
+        await asyncio.gather(*analysis)
+    return outcomes
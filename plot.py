@@ -2,13 +2,58 @@
 Plot the 1c XC integral data.
 """
 
+import multiprocessing
+import os
+from pathlib import Path
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns # type: ignore
+import seaborn as sns  # type: ignore
 
+# labels of the shell interactions (rows of the onecxcints array)
+SHELL_INTERACTIONS: tuple[str, ...] = (
+    r"$s$ - $p$",
+    r"$p$ - $p'$",
+    r"$s$ - $d$",
+    r"$p$ - $d$",
+    r"$d$ - $d'$",
+    r"$s$ - $f$",
+    r"$p$ - $f$",
+    r"$d$ - $f$",
+    r"$f$ - $f'$",
+)
 
-def plot_onexc_ints(array: np.ndarray) -> None:
+
+def onexc_frame(datasets: dict[str, np.ndarray]) -> pd.DataFrame:
+    """
+    Build the long-form DataFrame ("Shell Interaction", "Element Number",
+    "Integral Value", "Dataset") of one or more onecxcints arrays
+    by vectorized reshaping.
+    """
+    frames = []
+    for name, array in datasets.items():
+        nshell, nelem = array.shape
+        frames.append(
+            pd.DataFrame(
+                {
+                    "Shell Interaction": np.repeat(
+                        np.array(SHELL_INTERACTIONS[:nshell]), nelem
+                    ),
+                    "Element Number": np.tile(np.arange(nelem), nshell),
+                    "Integral Value": np.asarray(array).ravel(),
+                    "Dataset": name,
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def plot_onexc_ints(
+    array: np.ndarray | dict[str, np.ndarray],
+    headless: bool = False,
+    panels: bool = False,
+    outfile: str = "onecxcints.png",
+) -> None:
     """
     Plot the 1c XC integral data as a multi-line chart using seaborn.
 
@@ -17,66 +62,90 @@ def plot_onexc_ints(array: np.ndarray) -> None:
     - array.shape[1] corresponds to different elements (1..104).
 
     Args:
-        array (np.ndarray): The 1c XC integral data with shape (9, 104).
+        array (np.ndarray | dict[str, np.ndarray]): The 1c XC integral data with
+            shape (9, 104), or several of them (e.g. for different charge models)
+            that are overlaid in the same plot.
+        headless (bool): Use the non-interactive Agg backend and do not show the plot.
+        panels (bool): Plot each shell interaction in a separate panel.
+        outfile (str): File to which the figure is saved.
 
     Returns:
         None
     """
+    if headless:
+        plt.switch_backend("Agg")
+    datasets = array if isinstance(array, dict) else {"onecxcints": array}
+
     # Optional: set a nice theme
     sns.set_theme(style="whitegrid", context="talk")
+    # define Roboto Condensed as the default font
+    plt.rcParams["font.family"] = "sans-serif"
+    plt.rcParams["font.sans-serif"] = "Roboto Condensed"
+    plt.rcParams["font.weight"] = "regular"
 
     # Build a DataFrame from the array for easier plotting with seaborn
     # We’ll label each row (shell_interaction) and each column (element)
     # so that we can use seaborn's `lineplot` with a "hue" grouping.
-    data = []
-    for shell_idx in range(array.shape[0]):
-        for elem_idx in range(array.shape[1]):
-            shell_interaction: str
-            if shell_idx == 0:
-                shell_interaction = r"$s$ - $p$"
-            elif shell_idx == 1:
-                shell_interaction = r"$p$ - $p'$"
-            elif shell_idx == 2:
-                shell_interaction = r"$s$ - $d$"
-            elif shell_idx == 3:
-                shell_interaction = r"$p$ - $d$"
-            elif shell_idx == 4:
-                shell_interaction = r"$d$ - $d'$"
-            elif shell_idx == 5:
-                shell_interaction = r"$s$ - $f$"
-            elif shell_idx == 6:
-                shell_interaction = r"$p$ - $f$"
-            elif shell_idx == 7:
-                shell_interaction = r"$d$ - $f$"
-            elif shell_idx == 8:
-                shell_interaction = r"$f$ - $f'$"
-            data.append(
-                {
-                    "Shell Interaction": shell_interaction,
-                    "Element Number": elem_idx,
-                    "Integral Value": array[shell_idx, elem_idx],
-                }
-            )
+    df = onexc_frame(datasets)
+    style = "Dataset" if len(datasets) > 1 else None
 
-    df = pd.DataFrame(data)
+    if panels:
+        grid = sns.relplot(
+            data=df,
+            kind="line",
+            x="Element Number",
+            y="Integral Value",
+            col="Shell Interaction",
+            col_wrap=3,
+            hue="Dataset",
+            height=3.5,
+            aspect=1.4,
+        )
+        grid.set_axis_labels("element number", "integral value / a.u.")
+        grid.figure.suptitle("shell-averaged one-center exchange integrals")
+        grid.figure.tight_layout()
+    else:
+        plt.figure(figsize=(10, 6))
+        sns.lineplot(
+            data=df,
+            x="Element Number",
+            y="Integral Value",
+            hue="Shell Interaction",
+            style=style,
+            palette="tab10",  # Choose a nice color palette
+        )
+
+        plt.title("shell-averaged one-center exchange integrals")
+        plt.xlabel("element number")
+        plt.ylabel("integral value / a.u.")
+        plt.legend(loc="best")
+        plt.tight_layout()
+    # the figure is written atomically since several background renders
+    # may write the same file
+    outpath = Path(outfile)
+    tmpname = outpath.with_name(f".{outpath.stem}.{os.getpid()}{outpath.suffix}")
+    plt.savefig(tmpname, dpi=300, format=outpath.suffix[1:] or None)
+    os.replace(tmpname, outpath)
+    if headless:
+        plt.close("all")
+    else:
+        plt.show()
 
-    plt.figure(figsize=(10, 6))
-    # define Roboto Condensed as the default font
-    plt.rcParams["font.family"] = "sans-serif"
-    plt.rcParams["font.sans-serif"] = "Roboto Condensed"
-    plt.rcParams["font.weight"] = "regular"
-    sns.lineplot(
-        data=df,
-        x="Element Number",
-        y="Integral Value",
-        hue="Shell Interaction",
-        palette="tab10",  # Choose a nice color palette
-    )
 
-    plt.title("shell-averaged one-center exchange integrals")
-    plt.xlabel("element number")
-    plt.ylabel("integral value / a.u.")
-    plt.legend(loc="best")
-    plt.tight_layout()
-    plt.savefig("onecxcints.png", dpi=300)
-    plt.show()
+def plot_onexc_ints_background(
+    array: np.ndarray | dict[str, np.ndarray],
+    panels: bool = False,
+    outfile: str = "onecxcints.png",
+) -> multiprocessing.Process:
+    """
+    Render the plot (headless) in a separate process so that the calling
+    pipeline is not blocked. The process is joined at the latest when the
+    interpreter exits.
+    """
+    process = multiprocessing.Process(
+        target=plot_onexc_ints,
+        args=(array,),
+        kwargs={"headless": True, "panels": panels, "outfile": outfile},
+    )
+    process.start()
+    return process
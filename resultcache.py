@@ -0,0 +1,133 @@
+"""
+This module contains a persistent on-disk cache for the exchange integrals
+K[j, i] = ints[j, i, j, i] of single elements.
+
+The cache is content-addressed: the key is a hash of everything that determines
+the result of the qvSZP -> ORCA -> orca_2json chain, so that several working
+directories can share one cache directory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+
+# increase if the content of the cache entries changes
+CACHE_VERSION = 2
+
+
+def file_digest(filename: str | Path) -> str:
+    """
+    SHA-256 hash of the content of a file. Missing files are represented
+    by their path so that the key still changes if the path changes.
+    """
+    path = Path(filename)
+    if not path.is_file():
+        return f"missing:{path}"
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    f.close()
+    return sha.hexdigest()
+
+
+def binary_identity(binary: str | None) -> str:
+    """
+    Identity of an executable: resolved path, size and modification time.
+    Hashing the content of the (large) ORCA binaries on every run would be slow.
+    """
+    if binary is None:
+        return "missing"
+    path = Path(binary).resolve()
+    if not path.is_file():
+        return f"missing:{path}"
+    stat = path.stat()
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def cache_key(
+    ati: int,
+    q_cn: dict[str, float] | None,
+    chargemodel: str,
+    files: dict[str, str | Path],
+    binaries: dict[str, str | None],
+    options: list[str],
+) -> str:
+    """
+    Content hash of all inputs of the calculation of a single element.
+
+    Args:
+        ati (int): Atomic number of the element.
+        q_cn (dict | None): External charge and CN or None.
+        chargemodel (str): Charge model passed to qvSZP.
+        files (dict): Input files (orca_2json configuration, basis, ECP)
+                      that are hashed by content.
+        binaries (dict): Executables that are identified by path, size and mtime.
+        options (list[str]): Further command-line options of qvSZP
+                             that change the result.
+
+    Returns:
+        str: Hexadecimal SHA-256 key.
+    """
+    content = {
+        "version": CACHE_VERSION,
+        "element": ati,
+        "q_cn": q_cn,
+        "chargemodel": chargemodel,
+        "files": {name: file_digest(path) for name, path in sorted(files.items())},
+        "binaries": {
+            name: binary_identity(path) for name, path in sorted(binaries.items())
+        },
+        "options": options,
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True).encode("utf8")
+    ).hexdigest()
+
+
+class ResultCache:
+    """
+    Directory with one .npy file per cache key.
+    """
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory).expanduser().resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        """
+        File of the cache entry.
+        """
+        return self.directory / key[:2] / f"{key}.npy"
+
+    def load(self, key: str) -> np.ndarray | None:
+        """
+        Exchange matrix of the cache entry or None if the key is not cached.
+        """
+        path = self.path(key)
+        if not path.is_file():
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError) as err:
+            print(f"Ignoring unreadable cache entry {path}: {err}")
+            return None
+
+    def store(self, key: str, kmat: np.ndarray) -> None:
+        """
+        Store the exchange matrix. The file is written atomically so that
+        concurrent runs never see partially written entries.
+        """
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, kmat)
+            os.replace(tmpname, path)
+        except BaseException:
+            Path(tmpname).unlink(missing_ok=True)
+            raise
@@ -0,0 +1,265 @@
+"""
+This module contains the scan mode, in which the exchange integrals of each
+element are computed on a grid of external charges q and coordination numbers CN.
+
+The shell averages are stored in a memory-mapped table with the shape
+(element, q, CN, shell pair) that is filled incrementally, so that an interrupted
+scan can be resumed and partial results can already be used.
+Values between the grid points are obtained by bilinear interpolation.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable
+import numpy as np
+from numpy.lib.format import open_memmap
+from calculation import (
+    CalculationError,
+    find_guess,
+    load_result,
+    prepare_element,
+    run_calculation,
+    save_result,
+    scratch_directory,
+)
+from inthandler import SHELL_PAIRS, average_exchange_block, read_exchange_block
+from analyticints import analytic_exchange_block, read_basis
+from instrument import Timings
+
+# default file of the scan table and directory of the calculations
+SCAN_TABLE = "scan_table.npy"
+SCAN_DIR = "scan"
+# number of rows of the table (atomic numbers 0..103, as in onecxcints)
+NELEM = 104
+
+
+def parse_grid(spec: str) -> np.ndarray:
+    """
+    Grid points from "start:stop:num" (num equidistant points including both ends)
+    or a comma-separated list of values.
+    """
+    if ":" in spec:
+        start, stop, num = spec.split(":")
+        grid = np.linspace(float(start), float(stop), int(num))
+    else:
+        grid = np.array([float(value) for value in spec.split(",")])
+    if grid.size == 0 or np.any(np.diff(grid) <= 0.0):
+        raise ValueError(f"Grid {spec} is empty or not strictly increasing.")
+    return grid
+
+
+def grid_file(table_file: Path) -> Path:
+    """
+    File with the q and CN grid points belonging to a scan table.
+    """
+    return table_file.parent / (table_file.stem + "_grid.npz")
+
+
+def point_path(symbol: str, q: float, cn: float, scan_dir: str = SCAN_DIR) -> Path:
+    """
+    Directory of the calculation of an element at a grid point.
+    """
+    return Path(scan_dir, symbol, f"q{q:+.4f}_cn{cn:.4f}").resolve()
+
+
+def guess_candidates(symbol: str, bases: list[Path]) -> list[Path]:
+    """
+    Directories of previous calculations of an element that can provide an
+    initial guess: the element directory and all scan points of the element
+    in each of the base directories (e.g. the working directory and previous
+    sweeps).
+    """
+    candidates: list[Path] = []
+    for base in bases:
+        candidates.append(base / symbol)
+        candidates.extend(sorted((base / SCAN_DIR / symbol).glob("q*_cn*")))
+    return candidates
+
+
+def open_table(table_file: Path, q_grid: np.ndarray, cn_grid: np.ndarray) -> np.memmap:
+    """
+    Open the memory-mapped scan table for writing. A new table is filled with NaN
+    (not yet computed). An existing table is reused if it belongs to the same grid.
+    """
+    shape = (NELEM, q_grid.size, cn_grid.size, len(SHELL_PAIRS))
+    if table_file.is_file():
+        table = open_memmap(table_file, mode="r+")
+        with np.load(grid_file(table_file)) as grid:
+            same_grid = (
+                table.shape == shape
+                and np.allclose(grid["q"], q_grid)
+                and np.allclose(grid["cn"], cn_grid)
+            )
+        if not same_grid:
+            raise ValueError(
+                f"{table_file} belongs to a different grid. "
+                + "Remove it or choose another table file."
+            )
+        return table
+    table = open_memmap(table_file, mode="w+", dtype=np.float64, shape=shape)
+    table[:] = np.nan
+    table.flush()
+    np.savez(grid_file(table_file), q=q_grid, cn=cn_grid)
+    return table
+
+
+def load_table(table_file: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Read-only memory map of a scan table and its q and CN grid points.
+    """
+    table = np.load(table_file, mmap_mode="r")
+    with np.load(grid_file(table_file)) as grid:
+        return table, grid["q"], grid["cn"]
+
+
+def _bracket(grid: np.ndarray, x: float) -> tuple[int, int, float]:
+    """
+    Indices of the grid points enclosing x and the weight of the upper one.
+    """
+    if grid.size == 1:
+        if not np.isclose(x, grid[0]):
+            raise ValueError(f"{x} is not the only grid point {grid[0]}.")
+        return 0, 0, 0.0
+    if not grid[0] <= x <= grid[-1]:
+        raise ValueError(f"{x} is outside of the grid [{grid[0]}, {grid[-1]}].")
+    lower = int(np.clip(np.searchsorted(grid, x, side="right") - 1, 0, grid.size - 2))
+    return lower, lower + 1, (x - grid[lower]) / (grid[lower + 1] - grid[lower])
+
+
+def interpolate(
+    table: np.ndarray,
+    q_grid: np.ndarray,
+    cn_grid: np.ndarray,
+    ati: int,
+    q: float,
+    cn: float,
+) -> np.ndarray:
+    """
+    Bilinear interpolation of the shell averages of an element between the
+    grid points. The result is NaN if one of the enclosing points is missing.
+
+    Args:
+        table (np.ndarray): Scan table (element, q, CN, shell pair).
+        q_grid (np.ndarray): Charges of the grid.
+        cn_grid (np.ndarray): CNs of the grid.
+        ati (int): Atomic number of the element.
+        q (float): Charge.
+        cn (float): CN.
+
+    Returns:
+        np.ndarray: Shell averages with shape (len(SHELL_PAIRS),).
+    """
+    q0, q1, wq = _bracket(q_grid, q)
+    cn0, cn1, wcn = _bracket(cn_grid, cn)
+    return (
+        (1.0 - wq) * (1.0 - wcn) * table[ati, q0, cn0]
+        + wq * (1.0 - wcn) * table[ati, q1, cn0]
+        + (1.0 - wq) * wcn * table[ati, q0, cn1]
+        + wq * wcn * table[ati, q1, cn1]
+    )
+
+
+def run_point(
+    ati: int,
+    symbol: str,
+    q: float,
+    cn: float,
+    binaries: dict[str, str],
+    mpi: int,
+    timings: Timings,
+    scratch: str | None = None,
+    guess_bases: list[Path] | None = None,
+    analytic: bool = False,
+) -> np.ndarray:
+    """
+    Calculate an element at a grid point (or reuse a stored result) and
+    return its shell averages. If `guess_bases` is given, the SCF is started
+    from the orbitals of the closest finished calculation of the element
+    (see guess_candidates and calculation.find_guess). If `analytic` is True,
+    only qvSZP is run and the integrals are computed from the basis set
+    (see analyticints.py).
+    """
+    path = point_path(symbol, q, cn)
+    result = load_result(path)
+    if result is not None:
+        return result[0]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    chargemodel = prepare_element(ati, symbol, path, {"q": q, "CN": cn})
+    guess = None
+    if guess_bases is not None:
+        guess = find_guess({"q": q, "CN": cn}, guess_candidates(symbol, guess_bases))
+    with scratch_directory(
+        path, symbol, scratch, keep_gbw=guess_bases is not None
+    ) as workdir:
+        run_calculation(
+            symbol,
+            workdir,
+            chargemodel,
+            binaries,
+            mpi,
+            False,
+            dry_run=analytic,
+            timings=timings,
+            guess=guess,
+        )
+    if analytic:
+        with timings.stage(symbol, "analytic"):
+            kmat = analytic_exchange_block(read_basis(path / "hf_q-vSZP.inp"))
+    else:
+        with timings.stage(symbol, "parse"):
+            kmat = read_exchange_block(path / "hf_q-vSZP.json")
+    with timings.stage(symbol, "average"):
+        averages = average_exchange_block(kmat, ati, False)
+    save_result(path, averages, kmat)
+    return averages
+
+
+def run_scan(
+    table: np.memmap,
+    elements: list[int],
+    q_grid: np.ndarray,
+    cn_grid: np.ndarray,
+    calculate: Callable[[int, float, float], np.ndarray],
+    n_jobs: int,
+) -> dict[str, str]:
+    """
+    Calculate all missing (NaN) points of the table with `n_jobs` concurrent
+    calculations calculate(ati, q, cn). Each result is written to the table
+    as soon as it is available.
+
+    Returns:
+        dict[str, str]: Error messages of the failed points.
+    """
+    points = [
+        (ati, iq, icn)
+        for ati in elements
+        for iq in range(q_grid.size)
+        for icn in range(cn_grid.size)
+        if np.isnan(table[ati, iq, icn]).any()
+    ]
+    print(
+        f"Scanning {len(elements)} element(s) on {q_grid.size} x {cn_grid.size} "
+        + f"(q, CN) points: {len(points)} calculation(s) with {n_jobs} job(s)."
+    )
+    failures: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = {
+            executor.submit(calculate, ati, q_grid[iq], cn_grid[icn]): (ati, iq, icn)
+            for ati, iq, icn in points
+        }
+        try:
+            for ndone, future in enumerate(as_completed(futures), start=1):
+                ati, iq, icn = futures[future]
+                try:
+                    table[ati, iq, icn] = future.result()
+                except (CalculationError, OSError, ValueError) as err:
+                    label = f"{ati}/q={q_grid[iq]:+.4f}/CN={cn_grid[icn]:.4f}"
+                    print(f"Point {label} failed: {err}")
+                    failures[label] = str(err)
+                    continue
+                table.flush()
+                print(f"Finished point {ndone} of {len(points)}.")
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    return failures
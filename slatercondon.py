@@ -0,0 +1,154 @@
+"""
+This module compresses the exchange integrals of the valence shells of each
+element into a few radial Slater-Condon parameters (G^k, and F^k within a shell).
+
+For two shells a and b of the same center, every exchange integral is
+K[i, j] = sum_k A^k[m_i, m_j] R^k(a, b) with fixed angular factors A^k
+(see analyticints.angular_factors). The parameters R^k of all elements are
+obtained by a single least-squares fit per AO layout and shell pair. Any shell
+average or alternative weighting of the integrals can be regenerated from them
+without the full exchange matrices.
+"""
+
+import numpy as np
+from analyticints import angular_factors
+from inthandler import (
+    LAYOUTS,
+    NAO_MAX,
+    SHELL_PAIRS,
+    VALENCE_RANGES,
+    valence_layout,
+)
+
+# file with the parameters of all elements (shape (104, len(PARAMETERS)))
+SLATER_CONDON_FILE = "slater_condon.npy"
+# residual above which the integrals are not described by the parameters
+FIT_TOLERANCE = 1e-8
+# angular momentum of the shells in SHELL_PAIRS
+SHELL_ANGULAR_MOMENTA = {"s": 0, "p": 1, "d": 2, "f": 3}
+# parameters of an element: (shell pair in SHELL_PAIRS, k)
+PARAMETERS: tuple[tuple[str, int], ...] = tuple(
+    (label, k)
+    for label, bra, ket in SHELL_PAIRS
+    for k in angular_factors(SHELL_ANGULAR_MOMENTA[bra], SHELL_ANGULAR_MOMENTA[ket])
+)
+
+
+def _parameter_columns(label: str) -> np.ndarray:
+    """
+    Columns of the parameters of a shell pair in PARAMETERS.
+    """
+    return np.array(
+        [ipar for ipar, (name, _) in enumerate(PARAMETERS) if name == label]
+    )
+
+
+def _design_matrix(bra: str, ket: str) -> np.ndarray:
+    """
+    Angular factors A^k of a shell pair with shape (entries of the block, k).
+    """
+    factors = angular_factors(SHELL_ANGULAR_MOMENTA[bra], SHELL_ANGULAR_MOMENTA[ket])
+    return np.stack([factor.ravel() for factor in factors.values()], axis=1)
+
+
+def _layout_groups(atomic_numbers: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Positions of the elements of each AO layout (the dummy element 0 is skipped).
+    """
+    layouts = np.array([valence_layout(int(ati)) for ati in atomic_numbers])
+    return {
+        layout: np.flatnonzero((layouts == layout) & (atomic_numbers != 0))
+        for layout in LAYOUTS
+    }
+
+
+def fit_slater_condon(
+    kblocks: np.ndarray, atomic_numbers: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fit the Slater-Condon parameters of many elements by vectorized least squares.
+
+    Args:
+        kblocks (np.ndarray): Stacked exchange matrices K[j, i] = ints[j, i, j, i]
+                              with shape (nelem, NAO_MAX, NAO_MAX). Entries that
+                              are zero are taken from the transposed matrix.
+        atomic_numbers (np.ndarray | None): Atomic number of each block.
+                              If None, block k belongs to atomic number k
+                              (layout of exchange_blocks.npy).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Parameters with shape
+            (nelem, len(PARAMETERS)) and the maximum absolute residual of the fit
+            per element.
+    """
+    if atomic_numbers is None:
+        atomic_numbers = np.arange(kblocks.shape[0])
+    atomic_numbers = np.asarray(atomic_numbers)
+    # blocks with only one triangle (e.g. exchange_blocks.npy of earlier runs)
+    kblocks = np.where(kblocks != 0.0, kblocks, kblocks.transpose(0, 2, 1))
+    parameters = np.zeros((kblocks.shape[0], len(PARAMETERS)))
+    residuals = np.zeros(kblocks.shape[0])
+    for layout, members in _layout_groups(atomic_numbers).items():
+        if members.size == 0:
+            continue
+        ranges = VALENCE_RANGES[layout]
+        for label, bra, ket in SHELL_PAIRS:
+            if bra not in ranges or ket not in ranges:
+                continue
+            design = _design_matrix(bra, ket)
+            aos_bra, aos_ket = np.asarray(ranges[bra]), np.asarray(ranges[ket])
+            values = kblocks[np.ix_(members, aos_bra, aos_ket)]
+            values = values.reshape(members.size, -1)
+            fit = np.linalg.lstsq(design, values.T, rcond=None)[0]
+            parameters[np.ix_(members, _parameter_columns(label))] = fit.T
+            residual = np.abs(values - fit.T @ design.T).max(axis=1)
+            residuals[members] = np.maximum(residuals[members], residual)
+    return parameters, residuals
+
+
+def pair_blocks(parameters: np.ndarray, label: str) -> np.ndarray:
+    """
+    Exchange integrals between the AOs of a shell pair (in ORCA's order)
+    regenerated from the parameters.
+
+    Args:
+        parameters (np.ndarray): Parameters with shape (nelem, len(PARAMETERS)).
+        label (str): Shell pair in SHELL_PAIRS, e.g. "p-d".
+
+    Returns:
+        np.ndarray: Blocks with shape (nelem, 2 l_bra + 1, 2 l_ket + 1), e.g.
+                    for a custom weighting np.einsum("eij,ij->e", blocks, weights).
+    """
+    _, bra, ket = next(pair for pair in SHELL_PAIRS if pair[0] == label)
+    design = _design_matrix(bra, ket)
+    blocks = parameters[:, _parameter_columns(label)] @ design.T
+    return blocks.reshape(
+        -1, 2 * SHELL_ANGULAR_MOMENTA[bra] + 1, 2 * SHELL_ANGULAR_MOMENTA[ket] + 1
+    )
+
+
+def exchange_blocks_from_parameters(
+    parameters: np.ndarray, atomic_numbers: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Regenerate the valence part of the exchange matrices (all entries that enter
+    the shell averages) from the parameters, e.g. for
+    inthandler.average_shell_exchange_integrals_batched.
+
+    Returns:
+        np.ndarray: Exchange matrices with shape (nelem, NAO_MAX, NAO_MAX).
+    """
+    if atomic_numbers is None:
+        atomic_numbers = np.arange(parameters.shape[0])
+    atomic_numbers = np.asarray(atomic_numbers)
+    kblocks = np.zeros((parameters.shape[0], NAO_MAX, NAO_MAX))
+    for layout, members in _layout_groups(atomic_numbers).items():
+        ranges = VALENCE_RANGES[layout]
+        for label, bra, ket in SHELL_PAIRS:
+            if members.size == 0 or bra not in ranges or ket not in ranges:
+                continue
+            blocks = pair_blocks(parameters[members], label)
+            aos_bra, aos_ket = np.asarray(ranges[bra]), np.asarray(ranges[ket])
+            kblocks[np.ix_(members, aos_bra, aos_ket)] = blocks
+            kblocks[np.ix_(members, aos_ket, aos_bra)] = blocks.transpose(0, 2, 1)
+    return kblocks
@@ -0,0 +1,74 @@
+"""
+Shell averages of dense integral arrays that hold only one triangle.
+"""
+
+import numpy as np
+from inthandler import (
+    NAO_MAX,
+    SHELL_PAIRS,
+    VALENCE_RANGES,
+    average_shell_exchange_integrals,
+    scatter_integrals,
+    valence_layout,
+)
+
+
+def baseline_averages(ints: np.ndarray, ati: int) -> np.ndarray:
+    """
+    Shell averages as computed by the former per-shell-pair loops over
+    ints[j, i, j, i].
+    """
+    ranges = VALENCE_RANGES[valence_layout(ati)]
+    averages = np.zeros(len(SHELL_PAIRS))
+    for ipair, (_, bra, ket) in enumerate(SHELL_PAIRS):
+        if bra not in ranges or ket not in ranges:
+            continue
+        if bra == ket:
+            pairs = [
+                (i, j) for i in ranges[bra][:-1] for j in range(i + 1, ranges[bra][-1])
+            ]
+        else:
+            pairs = [(i, j) for i in ranges[bra] for j in ranges[ket]]
+        averages[ipair] = sum(ints[j, i, j, i] for i, j in pairs) / len(pairs)
+    return averages
+
+
+def one_triangle(seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exchange integral rows (pq|pq) with p > q and random values.
+    """
+    p, q = np.tril_indices(NAO_MAX, -1)
+    values = np.random.default_rng(seed).uniform(0.01, 0.5, p.size)
+    return np.column_stack((p, q, p, q)), values
+
+
+def test_canonical_triangle_matches_baseline() -> None:
+    """
+    With the (ji|ji), j > i, rows written by orca_2json, the averages are
+    unchanged with respect to the former averaging.
+    """
+    indices, values = one_triangle(0)
+    ints = scatter_integrals(indices, values, NAO_MAX)
+    for ati in (6, 26, 57, 64, 87):
+        np.testing.assert_allclose(
+            average_shell_exchange_integrals(ints, ati, False),
+            baseline_averages(ints, ati),
+            rtol=1e-14,
+        )
+
+
+def test_other_triangle_is_symmetrized() -> None:
+    """
+    With only the (ij|ij), j > i, rows, the former averaging saw zeros; the
+    symmetrized exchange matrix gives the averages of the canonical rows.
+    """
+    indices, values = one_triangle(1)
+    canonical = scatter_integrals(indices, values, NAO_MAX)
+    other = scatter_integrals(indices[:, [1, 0, 3, 2]], values, NAO_MAX)
+    for ati in (6, 26, 57, 64, 87):
+        assert not baseline_averages(other, ati).any()
+        np.testing.assert_allclose(
+            average_shell_exchange_integrals(other, ati, False),
+            baseline_averages(canonical, ati),
+            rtol=1e-14,
+        )
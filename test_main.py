@@ -0,0 +1,64 @@
+"""
+Merge step of sharded runs (main.py --merge).
+"""
+
+from pathlib import Path
+import numpy as np
+import pytest
+from calculation import save_result
+from inthandler import average_exchange_block
+from main import EXCHANGE_BLOCKS_FILE, PSE_SYMBOLS, main
+from slatercondon import (
+    PARAMETERS,
+    SLATER_CONDON_FILE,
+    exchange_blocks_from_parameters,
+)
+
+
+def test_merge_keeps_other_elements(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Merging the results of H, He and C over the results of a previous run keeps
+    the averages, exchange integrals and Slater-Condon parameters of Ce.
+    """
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    parameters = rng.uniform(0.1, 1.0, (104, len(PARAMETERS)))
+    kblocks = exchange_blocks_from_parameters(parameters)
+    previous = np.zeros((9, 104))
+    previous[:, 58] = average_exchange_block(kblocks[58], 58, False)
+    np.save("onecxcints.npy", previous)
+    np.save(
+        EXCHANGE_BLOCKS_FILE,
+        np.where(np.arange(104)[:, None, None] == 58, kblocks, 0.0),
+    )
+    np.save(
+        SLATER_CONDON_FILE, np.where(np.arange(104)[:, None] == 58, parameters, 0.0)
+    )
+    merged = [1, 2, 6]
+    for ati in merged:
+        element_path = tmp_path / PSE_SYMBOLS[ati]
+        element_path.mkdir()
+        save_result(
+            element_path, average_exchange_block(kblocks[ati], ati, False), kblocks[ati]
+        )
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--merge", "--elements", "h,he,c", "--no-plot"])
+    assert exit_info.value.code == 0
+
+    onecxcints = np.load("onecxcints.npy")
+    merged_blocks = np.load(EXCHANGE_BLOCKS_FILE)
+    merged_parameters = np.load(SLATER_CONDON_FILE)
+    for ati in [58] + merged:
+        np.testing.assert_allclose(
+            onecxcints[:, ati], average_exchange_block(kblocks[ati], ati, False)
+        )
+        np.testing.assert_allclose(merged_blocks[ati], kblocks[ati])
+        np.testing.assert_allclose(
+            exchange_blocks_from_parameters(merged_parameters)[ati],
+            kblocks[ati],
+            atol=1e-12,
+        )
+    np.testing.assert_array_equal(merged_parameters[58], parameters[58])